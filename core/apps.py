@@ -30,6 +30,7 @@ class CoreConfig(AppConfig):
         s.COORD_STORAGE = Path(s.STORAGE) / 'word_coordinates'
         s.OCR_DUMP_STORAGE = Path(s.STORAGE) / 'ocr'
         s.TEMP_TEST_DATA = Path(s.STORAGE) / 'temp_test_data'
+        s.SEARCH_SQLITE_PATH = Path(s.STORAGE) / 'search.sqlite3'
             # / STORAGE-dependent settings
 
         return
@@ -16,7 +16,7 @@ from lxml import etree
 from PIL import Image
 
 from django.core import management
-from django.db import reset_queries
+from django.db import reset_queries, transaction
 from django.db.models import Q
 from django.conf import settings
 from django.utils import timezone
@@ -179,6 +179,11 @@ class BatchLoader(object):
                 self.solr.commit()
 
             batch.save()
+            with transaction.atomic():
+                batch.update_counts()
+                self._update_title_counts(batch.lccns())
+            for lccn in batch.lccns():
+                Issue.reset_navigation(lccn)
             msg = "processed %s pages" % batch.page_count
             event = LoadBatchEvent(batch_name=batch_name, message=msg)
             _logger.info(msg)
@@ -198,6 +203,9 @@ class BatchLoader(object):
 
         # updates the min and max years of all titles
         set_fulltext_range()
+        # cached searches and pages go stale, now that everything they show
+        # (events and year ranges included) is written
+        solr_index.bump_index_generation()
         return batch
 
     def _get_batch(self, batch_name, batch_source=None, create=False):
@@ -407,6 +415,8 @@ class BatchLoader(object):
         else:
             _logger.info("No ocr filename for issue: %s page: %s" % (page.issue, page))
 
+        page.record_files(checksums=settings.PAGE_FILE_CHECKSUMS)
+
         _logger.debug("saving page: %s" % page.url)
         page.save()
         return page
@@ -505,9 +515,13 @@ class BatchLoader(object):
             event = LoadBatchEvent(batch_name=batch_name, message=msg)
             event.save()
             raise BatchLoaderException(msg)
+        finally:
+            # cached searches and pages go stale, even after a partial purge
+            solr_index.bump_index_generation()
 
     def _purge_batch(self, batch):
         batch_name = batch.name
+        lccns = list(batch.issues.order_by().values_list('title_id', flat=True).distinct())
         # just delete batch causes memory to bloat out
         # so we do it piece-meal
         for issue in batch.issues.all():
@@ -519,10 +533,22 @@ class BatchLoader(object):
                 reset_queries()
             issue.delete()
         batch.delete()
+        self._update_title_counts(lccns)
+        for lccn in lccns:
+            Issue.reset_navigation(lccn)
         if self.PROCESS_OCR:
             self.solr.delete(q='batch:"%s"' % batch_name)
             self.solr.commit()
 
+    def _update_title_counts(self, lccns):
+        """
+        Updates the issue counts kept on the titles of a batch that has just
+        been loaded or purged.
+        """
+        with transaction.atomic():
+            for title in Title.objects.filter(lccn__in=lccns):
+                title.update_counts()
+
 class BatchLoaderException(RuntimeError):
     pass
 
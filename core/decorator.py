@@ -1,14 +1,20 @@
 import os
 import re
 import time
+import hashlib
 
 from mimeparse import best_match
 
+from django.conf import settings
 from django.utils import cache
 from django.utils import encoding
+from django.utils.http import http_date
 from django.http import HttpResponse
 from django import urls
 
+from core import solr_index
+from core.middleware import HttpResponseServiceUnavailable
+
 
 class HttpResponseSeeOther(HttpResponse):
     status_code = 303
@@ -23,16 +29,114 @@ class HttpResponseUnsupportedMediaType(HttpResponse):
 
 
 
-def cache_page(ttl):
+def cache_page(ttl, server_cache=True, validators=True):
+    """
+    Sets caching headers for ttl seconds on the view's responses and, unless
+    server_cache is False or settings.RESPONSE_CACHE is off, keeps successful
+    GET responses in the 'responses' cache for ttl seconds as well, so repeat
+    requests (crawlers, mostly) don't rebuild them.  Cached responses vary on
+    the headers each response lists in Vary, and are all dropped when the
+    index generation changes (see solr_index.bump_index_generation), which
+    loading or purging batches and titles does.
+
+    Responses also get an ETag made from the same cache key and a
+    Last-Modified of the last time the generation changed, so a client
+    revalidating a response it already has gets a 304 before the view runs.
+    Views whose content changes without the generation changing (the home
+    page's "100 Years Ago Today", live counts) should pass validators=False.
+    """
     def decorator(function):
         def decorated_function(*args, **kwargs):
             request = args[0]
+            conditional = validators and request.method in ('GET', 'HEAD')
+            use_cache = server_cache and settings.RESPONSE_CACHE and request.method == 'GET'
+            if conditional or use_cache:
+                response_cache = solr_index.results_cache()
+                key_prefix = 'response_%s' % solr_index.index_generation()
+                key = cache.get_cache_key(request, key_prefix, 'GET', cache=response_cache)
+            if conditional:
+                last_modified = solr_index.index_generation_time()
+                if key:
+                    not_modified = cache.get_conditional_response(
+                        request, etag=_etag(key), last_modified=last_modified)
+                    if not_modified is not None:
+                        return not_modified
+
+            if use_cache:
+                response = response_cache.get(key) if key else None
+                if response is not None:
+                    _count_response_cache(response_cache, 'hits')
+                    response['X-Cache'] = 'HIT'
+                    return response
+                _count_response_cache(response_cache, 'misses')
+
             response = function(*args, **kwargs)
             cache.patch_response_headers(response, ttl)
+            if (conditional or use_cache) and response.status_code == 200:
+                key = cache.learn_cache_key(request, response, ttl, key_prefix,
+                                            cache=response_cache)
+            if conditional and response.status_code == 200:
+                if not response.has_header('ETag'):
+                    response['ETag'] = _etag(key)
+                if last_modified and not response.has_header('Last-Modified'):
+                    response['Last-Modified'] = http_date(last_modified)
+            if use_cache:
+                response['X-Cache'] = 'MISS'
+                if _cacheable(request, response):
+                    response_cache.set(key, response, ttl)
             return response
         return decorated_function
     return decorator
 
+def _etag(cache_key):
+    return '"%s"' % hashlib.md5(cache_key.encode('utf-8')).hexdigest()
+
+def _cacheable(request, response):
+    return (response.status_code == 200 and not response.streaming
+            and not response.cookies and not request.META.get('CSRF_COOKIE_USED')
+            and len(response.content) <= settings.RESPONSE_CACHE_MAX_BYTES)
+
+def _count_response_cache(response_cache, name):
+    if not settings.RESPONSE_CACHE_STATS:
+        return
+    key = 'response_cache_%s' % name
+    try:
+        response_cache.incr(key)
+    except ValueError:
+        response_cache.add(key, 1, None)
+
+def response_cache_stats():
+    """
+    Returns the number of response cache hits and misses counted since the
+    counters were last reset (or culled from the cache), if
+    settings.RESPONSE_CACHE_STATS is on.  Counting isn't atomic with every
+    cache backend (the file-based one reads and rewrites a file), so the
+    counts are approximate under concurrent requests.
+    """
+    response_cache = solr_index.results_cache()
+    return (response_cache.get('response_cache_hits', 0),
+            response_cache.get('response_cache_misses', 0))
+
+def reset_response_cache_stats():
+    solr_index.results_cache().delete_many(['response_cache_hits', 'response_cache_misses'])
+
+def solr_unavailable(f):
+    """
+    Returns a 503 Service Unavailable response rather than an error page when
+    solr isn't being contacted because it has been failing (see
+    solr_index.CircuitBreaker).
+    """
+    def f1(request, **kwargs):
+        try:
+            return f(request, **kwargs)
+        except solr_index.SolrUnavailable:
+            response = HttpResponseServiceUnavailable(
+                "Search is temporarily unavailable, please try again shortly.",
+                content_type="text/plain")
+            response['Retry-After'] = settings.SOLR_BREAKER_RESET_SECONDS
+            return response
+    return f1
+
 def rdf_view(f):
     def f1(request, **kwargs):
         # construct a http redirect response to html view
@@ -0,0 +1,82 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+
+from core import models
+from core import solr_index
+from core.management.commands import configure_logging
+
+configure_logging('audit_index_logging.config', 'audit_index.log')
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = """
+    Compares the pages in the database with the page documents in Solr and
+    lists any that are only in one of them ("missing" pages aren't in Solr,
+    "stale" documents have no page in the database), e.g. after a failed
+    batch load or purge.  Both sides are read in id order and compared as
+    they stream in, so memory use stays flat however many pages there are.
+    Use --reindex and --delete to fix the differences without a full
+    reindex.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reindex', action='store_true', default=False, dest='reindex',
+            help='Index pages that are missing from Solr')
+        parser.add_argument(
+            '--delete', action='store_true', default=False, dest='delete',
+            help='Delete Solr documents for pages that are no longer in the database')
+        parser.add_argument(
+            '--rows', type=int, default=10000, dest='rows',
+            help='Ids to fetch from Solr per request (default: 10000)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000, dest='chunk_size',
+            help='Issues to fetch pages for per database query (default: 1000)')
+        parser.add_argument(
+            '--batch-size', type=int, default=100, dest='batch_size',
+            help='Documents to send to Solr per update (default: 100)')
+
+    def handle(self, *args, **options):
+        self.solr = solr_index.conn()
+        self.batch_size = options['batch_size']
+        self.missing = []
+        self.stale = []
+        counts = {True: 0, False: 0}
+        t0 = time.time()
+
+        differences = solr_index.diff_page_ids(
+            solr_index.database_page_ids(options['chunk_size']),
+            solr_index.index_page_ids(options['rows']))
+        for page_id, in_database in differences:
+            counts[in_database] += 1
+            self.stdout.write('%s %s' % ('missing' if in_database else 'stale', page_id))
+            if in_database and options['reindex']:
+                self.missing.append(page_id)
+            elif not in_database and options['delete']:
+                self.stale.append(page_id)
+            if len(self.missing) >= self.batch_size or len(self.stale) >= self.batch_size:
+                self.fix()
+        self.fix()
+
+        if options['reindex'] or options['delete']:
+            self.solr.commit()
+            solr_index.bump_index_generation()
+
+        log.info("audit found %i pages missing from solr and %i stale documents in %.1fs",
+                 counts[True], counts[False], time.time() - t0)
+        self.stdout.write('%i missing, %i stale' % (counts[True], counts[False]))
+
+    def fix(self):
+        if self.missing:
+            pages = models.Page.lookup_many(self.missing)
+            log.info("indexing %i missing pages", len(pages))
+            self.solr.add([page.solr_doc for page in pages.values()])
+            self.missing = []
+        if self.stale:
+            log.info("deleting %i stale documents", len(self.stale))
+            self.solr.delete(id=self.stale)
+            self.stale = []
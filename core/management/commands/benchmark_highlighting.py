@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from django.test import override_settings
+
+from core import solr_index
+
+DEFAULT_SEARCHES = [
+    'andtext=fire%20department',
+    'ortext=new%20york',
+    'phrasetext=the%20president',
+    'andtext=election&language=English',
+]
+
+MODES = ('inline', 'lazy')
+
+
+class Command(BaseCommand):
+    help = """
+    Compares the ways results pages can get highlighting from Solr (see the
+    SOLR_HIGHLIGHT_MODE setting) by timing how long it takes to build the
+    first page of results for each search, with the search cache turned off.
+    Searches are given as they appear in a search results URL, e.g.
+    "andtext=fire%%20department&language=English".
+    """
+
+    def add_arguments(self, parser):
+        # Positional arguments
+        parser.add_argument('searches', nargs='*',
+                            help='Search query strings (default: a few simple searches)')
+
+        # Options
+        parser.add_argument(
+            '--repeat', type=int, default=10, dest='repeat',
+            help='Number of times to run each search (default: 10)')
+        parser.add_argument(
+            '--rows', type=int, default=20, dest='rows',
+            help='Results per page (default: 20)')
+        parser.add_argument(
+            '--method', default=None, dest='method',
+            help='Solr highlighter to use (hl.method), e.g. "unified"')
+
+    def handle(self, searches=None, *args, **options):
+        repeat = options['repeat']
+        for search in searches or DEFAULT_SEARCHES:
+            self.stdout.write(search)
+            d = QueryDict(search, mutable=True)
+            d['rows'] = options['rows']
+            for mode in MODES:
+                with override_settings(SOLR_HIGHLIGHT_MODE=mode,
+                                       SOLR_HIGHLIGHT_METHOD=options['method'],
+                                       SOLR_SEARCH_CACHE_TTL=0):
+                    times = []
+                    for i in range(repeat):
+                        t0 = time.time()
+                        page = solr_index.SolrPaginator(d).page(1)
+                        times.append(time.time() - t0)
+                times.sort()
+
+                self.stdout.write(
+                    '  %-8s median %dms  max %dms  hits %d  words %d'
+                    % (mode, times[len(times) // 2] * 1000, times[-1] * 1000,
+                       page.paginator.count,
+                       sum(len(p.words) for p in page.object_list)))
@@ -0,0 +1,63 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.http import QueryDict
+from django.test import override_settings
+
+from core import solr_index
+
+DEFAULT_SEARCHES = [
+    'ortext=new%20york',
+    'andtext=fire%20department',
+    'phrasetext=the%20president',
+    'proxtext=railroad%20accident&proxdistance=5',
+    'andtext=election&language=English',
+]
+
+MODES = ('boolean', 'edismax')
+
+
+class Command(BaseCommand):
+    help = """
+    Compares the ways page searches can query the OCR fields (see the
+    SOLR_OCR_QUERY_MODE setting): how long each query takes to build, how long
+    the query is, how long Solr takes to run it (QTime) and how many pages it
+    finds.  Searches are given as they appear in a search results URL, e.g.
+    "andtext=fire%%20department&language=English".
+    """
+
+    def add_arguments(self, parser):
+        # Positional arguments
+        parser.add_argument('searches', nargs='*',
+                            help='Search query strings (default: a few simple searches)')
+
+        # Options
+        parser.add_argument(
+            '--repeat', type=int, default=10, dest='repeat',
+            help='Number of times to run each query (default: 10)')
+
+    def handle(self, searches=None, *args, **options):
+        repeat = options['repeat']
+        solr = solr_index.conn()
+        for search in searches or DEFAULT_SEARCHES:
+            self.stdout.write(search)
+            for mode in MODES:
+                with override_settings(SOLR_OCR_QUERY_MODE=mode):
+                    d = QueryDict(search)
+                    build = timeit.timeit(lambda: solr_index.page_search(d),
+                                          number=repeat) / repeat
+                    q, fq, facet_params, q_params = solr_index.page_search(d)
+
+                size = len(q) + sum(len(str(v)) for v in q_params.values())
+                qtimes = []
+                for i in range(repeat):
+                    # vary rows so solr's query result cache can't answer
+                    results = solr.search(q, fq=fq, fl='id', rows=10 + i,
+                                          **q_params)
+                    qtimes.append(results.qtime)
+                qtimes.sort()
+
+                self.stdout.write(
+                    '  %-8s build %.3fms  size %6d chars  QTime median %dms max %dms  hits %d'
+                    % (mode, build * 1000, size, qtimes[len(qtimes) // 2],
+                       qtimes[-1], results.hits))
@@ -8,3 +8,4 @@ class Command(BaseCommand):
 
     def handle(self, **options):
         solr_index.conn().commit()
+        solr_index.bump_index_generation()
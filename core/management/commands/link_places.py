@@ -9,7 +9,7 @@ try:
 except ImportError:
     import json
 
-from core import models
+from core import models, solr_index
 from core.management.commands import configure_logging
 
 configure_logging("openoni_link_places.config", "openoni_link_places.log")
@@ -60,6 +60,8 @@ class Command(BaseCommand):
 
             reset_queries()
         _logger.info("finished looking up places in dbpedia")
+        # cached pages still need to go stale
+        solr_index.bump_index_generation()
 
         _logger.info("dumping place_links.json fixture")
 
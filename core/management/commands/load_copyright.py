@@ -5,6 +5,7 @@ import datetime
 from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
 
+from core import solr_index
 from core.load_copyright import loadCopyright
 from core.management.commands import configure_logging
 
@@ -31,6 +32,8 @@ class Command(BaseCommand):
 
         try:
             loadCopyright(filepath)
+            # cached title pages show the copyright statements
+            solr_index.bump_index_generation()
         except Exception as e:
             LOGGER.exception(e)
             raise CommandError("unable to load copyrights. check the load_batch log for clues")
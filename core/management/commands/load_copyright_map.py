@@ -5,6 +5,7 @@ import datetime
 from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
 
+from core import solr_index
 from core.load_copyright_map import loadCopyrightMap
 from core.management.commands import configure_logging
 
@@ -34,6 +35,8 @@ class Command(BaseCommand):
 
         try:
             loadCopyrightMap(filepath)
+            # cached issue and page views show the copyright statements
+            solr_index.bump_index_generation()
         except Exception as e:
             LOGGER.exception(e)
             raise CommandError("unable to load copyright maps. check the load_batch log for clues")
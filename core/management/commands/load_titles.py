@@ -52,7 +52,10 @@ class Command(BaseCommand):
             # need to index any titles that we just created
             _logger.info("indexing new titles")
             solr_index.index_titles(since=self.xml_start)
-        
+        else:
+            # cached pages still need to go stale
+            solr_index.bump_index_generation()
+
         return results
 
     def add_results(self, results):
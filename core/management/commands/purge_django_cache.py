@@ -3,6 +3,7 @@ import logging
 from django.core.cache import cache
 from django.core.management.base import BaseCommand, CommandError
 
+from core import solr_index
 from core.management.commands import configure_logging
 
 configure_logging('', 'purge_django_cache.log' )
@@ -19,6 +20,9 @@ class Command(BaseCommand):
             # delete the advanced search title list
             LOGGER.info('removing titles_states from cache')
             cache.delete('titles_states')
+            # and every cached search and page
+            LOGGER.info('invalidating cached searches and pages')
+            solr_index.bump_index_generation()
 
         except Exception as e:
             LOGGER.exception(e)
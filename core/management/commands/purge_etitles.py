@@ -45,3 +45,4 @@ class Command(BaseCommand):
                     title.delete()
         if not options['pretend']:
             solr_index.conn().commit()
+            solr_index.bump_index_generation()
@@ -0,0 +1,66 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from core import models
+from core.management.commands import configure_logging
+
+configure_logging('record_page_files_logging.config', 'record_page_files.log')
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = """
+    Records the sizes (and with --checksums, the SHA-1 digests) of page
+    files on the pages in the database, which batch loading does for new
+    pages.  Only pages with nothing recorded yet are read unless --all is
+    given.  Pages showing an "Unknown" image size need this run.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch', dest='batch',
+            help='Only record files for pages in the named batch')
+        parser.add_argument(
+            '--checksums', action='store_true', default=False, dest='checksums',
+            help='Also record SHA-1 digests, which reads every file in full')
+        parser.add_argument(
+            '--all', action='store_true', default=False, dest='all',
+            help='Record files for pages that already have them recorded')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000, dest='chunk_size',
+            help='Pages to save per database update (default: 1000)')
+
+    def handle(self, *args, **options):
+        pages = models.Page.objects.select_related('issue__batch').order_by('id')
+        if options['batch']:
+            if not models.Batch.objects.filter(name=options['batch']).exists():
+                raise CommandError('no batch named %s' % options['batch'])
+            pages = pages.filter(issue__batch__name=options['batch'])
+        if not options['all']:
+            suffix = '_sha1' if options['checksums'] else '_size'
+            pages = pages.filter(**dict(('%s%s__isnull' % (file_type, suffix), True)
+                                        for file_type in models.Page.FILE_TYPES))
+
+        fields = ['%s_%s' % (file_type, field)
+                  for file_type in models.Page.FILE_TYPES
+                  for field in ('size', 'sha1')]
+        count = 0
+        chunk = []
+        t0 = time.time()
+        for page in pages.iterator(chunk_size=options['chunk_size']):
+            page.record_files(checksums=options['checksums'])
+            chunk.append(page)
+            if len(chunk) >= options['chunk_size']:
+                models.Page.objects.bulk_update(chunk, fields)
+                count += len(chunk)
+                chunk = []
+                log.info("recorded files for %i pages" % count)
+        models.Page.objects.bulk_update(chunk, fields)
+        count += len(chunk)
+
+        log.info("recorded files for %i pages in %.1fs", count, time.time() - t0)
+        self.stdout.write('recorded files for %i pages' % count)
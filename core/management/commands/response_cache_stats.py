@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core import decorator
+
+
+class Command(BaseCommand):
+    help = """
+    Shows how many requests to views using cache_page were answered from the
+    server-side response cache (hits) and how many had to be built (misses)
+    since the counters were last reset.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', default=False, dest='reset',
+            help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        hits, misses = decorator.response_cache_stats()
+        total = hits + misses
+        self.stdout.write('hits %d  misses %d  hit rate %.1f%%'
+                          % (hits, misses, 100.0 * hits / total if total else 0))
+        if options['reset']:
+            decorator.reset_response_cache_stats()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from core import models
+
+
+class Command(BaseCommand):
+    help = """
+    Recounts the pages, issues and titles kept on batches and the issues
+    kept on titles, which loading and purging batches keep up to date.  Run
+    it after upgrading, or after changing issues or pages other than by
+    loading or purging batches.
+    """
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for batch in models.Batch.objects.all():
+                batch.update_counts()
+
+            titles = (models.Title.objects.order_by()
+                      .annotate(issues_counted=Count('issues'))
+                      .values_list('lccn', 'issue_count', 'issues_counted'))
+            updated = 0
+            for lccn, issue_count, issues_counted in titles:
+                if issue_count != issues_counted:
+                    models.Title.objects.filter(lccn=lccn).update(issue_count=issues_counted)
+                    updated += 1
+
+        self.stdout.write('updated counts for %i batches and %i titles' % (
+            models.Batch.objects.count(), updated))
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from core import models as m
+from core import solr_index
     
 class Command(BaseCommand):
     help = "Updates the Title.has_issues property appropriately"
@@ -12,4 +13,6 @@ class Command(BaseCommand):
             print("%s has issues" % t)
             t.has_issues = True
             t.save()
+        # cached pages still need to go stale
+        solr_index.bump_index_generation()
 
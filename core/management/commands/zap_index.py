@@ -16,3 +16,4 @@ class Command(BaseCommand):
         solr = solr_index.conn()
         solr.delete(q='*:*')
         solr.commit()
+        solr_index.bump_index_generation()
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_utf8fix'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='page',
+            index=models.Index(fields=['issue', 'sequence'], name='core_page_issue_i_56fc0e_idx'),
+        ),
+    ]
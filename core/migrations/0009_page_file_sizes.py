@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_page_issue_sequence_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='jp2_sha1',
+            field=models.CharField(max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='jp2_size',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='ocr_sha1',
+            field=models.CharField(max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='ocr_size',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='pdf_sha1',
+            field=models.CharField(max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='pdf_size',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='tiff_sha1',
+            field=models.CharField(max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='tiff_size',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_page_file_sizes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='issue_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='page_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='title_lccns',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='issue_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
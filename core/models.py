@@ -7,6 +7,7 @@ import datetime
 import hashlib
 import logging
 import tarfile
+import bisect
 import textwrap
 import urllib.parse
 import io
@@ -15,16 +16,24 @@ from rfc3339 import rfc3339
 from lxml import etree
 from urllib.request import url2pathname
 
+from django.core.cache import cache
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q, Min, Sum
 from django.conf import settings
+from django.utils.functional import cached_property
 from django.utils.http import urlquote
 
 from core.utils.image_urls import thumb_image_url, page_iiif_info_url
+from core.utils.json_stream import iterencode
+from core.utils.url import url_template
 
 from django import urls
 
 
+# solr page document IDs are page URLs: /lccn/<lccn>/<date>/ed-<n>/seq-<n>/
+PAGE_ID_RE = re.compile(r'/lccn/(.+)/(.+)/ed-(\d+)/seq-(\d+)/?')
+
+
 class Awardee(models.Model):
     org_code = models.CharField(max_length=50, primary_key=True)
     name = models.CharField(max_length=100)
@@ -32,11 +41,12 @@ class Awardee(models.Model):
 
     @property
     def batch_count(self):
-        return Batch.objects.filter(awardee__org_code=self.org_code).count()
+        return self.batches.count()
 
     @property
     def page_count(self):
-        return Page.objects.filter(issue__batch__awardee__org_code=self.org_code).count()
+        # from the page counts kept on the batches, without touching pages
+        return self.batches.aggregate(pages=Sum('page_count'))['pages'] or 0
 
     @property
     def url(self):
@@ -78,10 +88,14 @@ class Batch(models.Model):
     awardee = models.ForeignKey('Awardee', related_name='batches', null=True, on_delete = models.CASCADE)
     source = models.CharField(max_length=4096, null=True)
     sitemap_indexed = models.DateTimeField(auto_now_add=False, null=True)
+    # denormalized from the batch's issues and pages (see update_counts)
+    issue_count = models.IntegerField(default=0)
+    page_count = models.IntegerField(default=0)
+    title_lccns = models.TextField(default='')
 
     @classmethod
     def viewable_batches(klass):
-        batches = Batch.objects.all()
+        batches = Batch.objects.select_related('awardee')
         return batches.order_by("-created")
 
     @property
@@ -110,10 +124,6 @@ class Batch(models.Model):
     def validated_batch_url(self):
         return urllib.parse.urljoin(self.storage_url, self.validated_batch_file)
 
-    @property
-    def page_count(self):
-        return Page.objects.filter(issue__batch__name=self.name).count()
-
     @property
     def url(self):
         return urls.reverse('openoni_batch', kwargs={'batch_name': self.name})
@@ -127,11 +137,20 @@ class Batch(models.Model):
         return self.url.rstrip('/') + '#batch'
 
     def lccns(self):
-        # TODO: rewrite me
-        l = {}
-        for issue in self.issues.all():
-            l[issue.title_id] = 1
-        return list(l.keys())
+        return self.title_lccns.split()
+
+    def update_counts(self):
+        """
+        Recounts the batch's issues and pages and the titles they belong to,
+        and saves them, so listing batches doesn't have to.
+        """
+        issues = self.issues.order_by()
+        self.issue_count = issues.count()
+        self.page_count = Page.objects.filter(issue__batch=self).count()
+        self.title_lccns = ' '.join(sorted(issues.values_list('title_id', flat=True).distinct()))
+        Batch.objects.filter(pk=self.pk).update(
+            issue_count=self.issue_count, page_count=self.page_count,
+            title_lccns=self.title_lccns)
 
     def delete(self, *args, **kwargs):
         # manually delete any OcrDump associated with this batch
@@ -143,7 +162,11 @@ class Batch(models.Model):
             logging.warn("no OcrDump to delete for %s", self)
         super(Batch, self).delete(*args, **kwargs)
 
-    def json(self, host, include_issues=True, serialize=True):
+    def json(self, host, include_issues=True, serialize=True, stream=False):
+        """
+        Returns the batch's IIIF collection.  With stream=True it is an
+        iterator over the JSON, which reads the batch's issues as it goes.
+        """
         b = {
             "@context": "http://iiif.io/api/presentation/2/context.json",
             "@id": settings.BASE_URL + self.json_url,
@@ -156,18 +179,30 @@ class Batch(models.Model):
             ],
         }
         if include_issues:
-            b['manifests'] = []
-            for issue in self.issues.all():
-                b['manifests'].append({
-                    "@id": settings.BASE_URL + issue.json_url,
-                    "@type": "sc:Manifest",
-                    "label": str(issue)
-                })
+            manifests = self._issue_manifests()
+            b['manifests'] = manifests if stream else list(manifests)
+        if stream:
+            return iterencode(b)
         if serialize:
             return json.dumps(b)
         else:
             return b
 
+    def _issue_manifests(self):
+        # a batch has issues of only a few titles
+        titles = {}
+        issues = self.issues.values_list('title_id', 'date_issued', 'edition')
+        for lccn, date_issued, edition in issues.iterator():
+            if lccn not in titles:
+                titles[lccn] = (Title.objects.get(lccn=lccn),
+                                Issue.url_template('openoni_issue_pages_dot_json', lccn))
+            title, template = titles[lccn]
+            yield {
+                "@id": settings.BASE_URL + Issue.format_url(template, date_issued, edition),
+                "@type": "sc:Manifest",
+                "label": "%s [%s]" % (title.display_name, date_issued)
+            }
+
     def __str__(self):
         return self.full_name
 
@@ -215,6 +250,13 @@ class Title(models.Model):
     has_issues = models.BooleanField(default=False, db_index=True)
     uri = models.URLField(null=True, max_length=500, help_text="856$u")
     sitemap_indexed = models.DateTimeField(auto_now_add=False, null=True)
+    # denormalized from the title's issues (see update_counts)
+    issue_count = models.IntegerField(default=0)
+
+    def update_counts(self):
+        """Recounts the title's issues and saves the count"""
+        self.issue_count = self.issues.count()
+        Title.objects.filter(pk=self.pk).update(issue_count=self.issue_count)
 
     @property
     def url(self):
@@ -275,6 +317,25 @@ class Title(models.Model):
             ht.append('Online Resource')
         return ht
 
+    @property
+    def page_solr_fields(self):
+        """
+        The title fields page documents carry too, because page searches
+        filter, facet or sort on them.  Everything else about the title is
+        only in the title's own document (see solr_index._title_api_fields).
+        """
+        places = list(self.places.all())
+        return {
+            'lccn': self.lccn,
+            'title_normal': self.name_normal,
+            'frequency': self.frequency,
+            'language': [l.name for l in self.languages.all()],
+            'city': [p.city for p in places],
+            'county': [p.county for p in places],
+            'country': self.country.name,
+            'state': [p.state for p in places],
+        }
+
     @property
     def solr_doc(self):
         doc = {
@@ -320,27 +381,37 @@ class Title(models.Model):
             meta.append(m)
         return meta
 
-    def json(self, host, serialize=True):
+    def json(self, host, serialize=True, stream=False):
+        """
+        Returns the title's IIIF collection.  With stream=True it is an
+        iterator over the JSON, which reads the title's issues as it goes.
+        """
+        manifests = self._issue_manifests()
         j = {
             "@context": "http://iiif.io/api/presentation/2/context.json", 
             "@id": settings.BASE_URL + self.json_url,
             "@type": "sc:Collection",
             "label": self.display_name,
-            "manifests": [],
+            "manifests": manifests if stream else list(manifests),
             "metadata": self.metadata
         }
 
-        for issue in self.issues.all():
-            j["manifests"].append({
-                "@id": settings.BASE_URL + issue.json_url,
-                "@type": "sc:Manifest",
-                "label": issue.date_issued.strftime('%Y-%m-%d')
-            })
-
+        if stream:
+            return iterencode(j, indent=2)
         if serialize:
             return json.dumps(j, indent=2)
         return j
 
+    def _issue_manifests(self):
+        template = Issue.url_template('openoni_issue_pages_dot_json', self.lccn)
+        issues = self.issues.values_list('date_issued', 'edition')
+        for date_issued, edition in issues.iterator():
+            yield {
+                "@id": settings.BASE_URL + Issue.format_url(template, date_issued, edition),
+                "@type": "sc:Manifest",
+                "label": date_issued.strftime('%Y-%m-%d')
+            }
+
     def has_non_english_language(self):
         for language in self.languages.all():
             if language.code != 'eng':
@@ -500,6 +571,22 @@ class Issue(models.Model):
     def __str__(self):
         return "%s [%s]" % (self.title.display_name, self.date_issued)
 
+    @staticmethod
+    def url_template(viewname, lccn):
+        """
+        Returns a template for the viewname URLs (which must take an
+        issue's lccn, date and edition) of the title's issues, for building
+        many of them with format_url without reversing each one.
+        """
+        return url_template(viewname, {'date': '1234-56-78', 'edition': 987654321},
+                            lccn=lccn)
+
+    @staticmethod
+    def format_url(template, date_issued, edition):
+        return template % {
+            'date': "%04i-%02i-%02i" % (date_issued.year, date_issued.month, date_issued.day),
+            'edition': edition}
+
     @property
     def url(self):
         date = self.date_issued
@@ -560,21 +647,96 @@ class Issue(models.Model):
             next_issue = None
         return next_issue
 
-    @property
+    @staticmethod
+    def navigation(lccn):
+        """
+        returns a title's issues as a list of (date_issued, id, edition,
+        first page sequence or None) tuples, sorted the way
+        get_previous/next_by_date_issued walk them.  It's cached until
+        reset_navigation is called, which the batch loader does for the
+        titles in a batch it loads or purges and Issue.delete does too;
+        issues deleted any other way are noticed when they're looked up.
+        """
+        key = 'issue_navigation_%s' % lccn
+        navigation = cache.get(key)
+        if navigation is None:
+            navigation = list(Issue.objects.filter(title_id=lccn)
+                              .order_by('date_issued', 'id')
+                              .annotate(first_sequence=Min('pages__sequence'))
+                              .values_list('date_issued', 'id', 'edition', 'first_sequence'))
+            cache.set(key, navigation)
+        return navigation
+
+    @staticmethod
+    def reset_navigation(lccn):
+        cache.delete('issue_navigation_%s' % lccn)
+
+    def _neighbour(self, step, with_pages=False):
+        """
+        returns the navigation tuple of the closest issue before (step=-1) or
+        after (step=1) this one that isn't a 'duplicate' of it, and that has
+        pages if with_pages is set.
+        """
+        key = (self.date_issued, self.id)
+        navigation = Issue.navigation(self.title_id)
+        i = bisect.bisect_left(navigation, key)
+        if i == len(navigation) or navigation[i][:2] != key:
+            # this issue is newer than the cached navigation
+            Issue.reset_navigation(self.title_id)
+            navigation = Issue.navigation(self.title_id)
+            i = bisect.bisect_left(navigation, key)
+        if step < 0 or (i < len(navigation) and navigation[i][:2] == key):
+            i += step
+        while 0 <= i < len(navigation):
+            date_issued, id, edition, sequence = navigation[i]
+            duplicate = date_issued == self.date_issued and edition == self.edition
+            if not duplicate and (sequence is not None or not with_pages):
+                return navigation[i]
+            i += step
+        return None
+
+    def _neighbour_issue(self, step):
+        for attempt in range(2):
+            neighbour = self._neighbour(step)
+            if neighbour is None:
+                return None
+            issue = Issue.objects.select_related('title').filter(id=neighbour[1]).first()
+            if issue is not None:
+                return issue
+            # the cached navigation lists an issue deleted since
+            Issue.reset_navigation(self.title_id)
+        return None
+
+    @cached_property
     def previous(self):
         """return the previous issue to this one (skipping over 'duplicates')"""
-        previous_issue = self._previous
-        while previous_issue is not None and previous_issue.date_issued == self.date_issued and previous_issue.edition == self.edition:
-            previous_issue = previous_issue._previous
-        return previous_issue
+        return self._neighbour_issue(-1)
 
-    @property
+    @cached_property
     def next(self):
         """return the next issue to this one (skipping over 'duplicates')"""
-        next_issue = self._next
-        while next_issue is not None and next_issue.date_issued == self.date_issued and next_issue.edition == self.edition:
-            next_issue = next_issue._next
-        return next_issue
+        return self._neighbour_issue(1)
+
+    def neighbour_first_pages(self):
+        """
+        returns the first pages of the closest previous and next issues that
+        have pages (skipping over 'duplicates'), either of which may be None,
+        with one query at most.
+        """
+        for attempt in range(2):
+            neighbours = [self._neighbour(-1, True), self._neighbour(1, True)]
+            q = Q()
+            for date_issued, id, edition, sequence in filter(None, neighbours):
+                q |= Q(issue_id=id, sequence=sequence)
+            if not q:
+                return None, None
+            pages = dict(((p.issue_id, p.sequence), p)
+                         for p in Page.objects.filter(q).select_related('issue'))
+            if len(pages) == len(list(filter(None, neighbours))):
+                break
+            # the cached navigation lists issues or pages deleted since
+            Issue.reset_navigation(self.title_id)
+        return [pages.get((n[1], n[3])) if n else None for n in neighbours]
 
     def save(self, *args, **kwargs):
         """override the default save behavior to populate has_issues on title.
@@ -589,6 +751,7 @@ class Issue(models.Model):
         set to False when the last issue is deleted.
         """
         super(Issue, self).delete(*args, **kwargs)
+        Issue.reset_navigation(self.title_id)
         if self.title.issues.all().count() == 0:
             self.title.has_issues = False
             self.title.save()
@@ -660,6 +823,15 @@ class Page(models.Model):
     jp2_length = models.IntegerField(null=True)
     pdf_filename = models.CharField(max_length=250, null=True)
     ocr_filename = models.CharField(max_length=250, null=True)
+    # recorded at load time (see record_files) so views don't stat the files
+    tiff_size = models.BigIntegerField(null=True)
+    jp2_size = models.BigIntegerField(null=True)
+    pdf_size = models.BigIntegerField(null=True)
+    ocr_size = models.BigIntegerField(null=True)
+    tiff_sha1 = models.CharField(max_length=40, null=True)
+    jp2_sha1 = models.CharField(max_length=40, null=True)
+    pdf_sha1 = models.CharField(max_length=40, null=True)
+    ocr_sha1 = models.CharField(max_length=40, null=True)
     issue = models.ForeignKey('Issue', related_name='pages', on_delete = models.CASCADE)
     reel = models.ForeignKey('Reel', related_name='pages', null=True, on_delete = models.CASCADE)
     indexed = models.BooleanField(default=False)
@@ -736,6 +908,29 @@ class Page(models.Model):
     def ocr_abs_filename(self):
         return self._abs_path(self.ocr_filename)
 
+    FILE_TYPES = ('tiff', 'jp2', 'pdf', 'ocr')
+
+    def record_files(self, checksums=False):
+        """
+        Sets the size (and, if checksums is True, the SHA-1 digest) of each
+        of the page's files, leaving them empty for files it doesn't have or
+        that can't be read.  Without checksums, a digest already recorded is
+        kept only while the file's size is unchanged.  Doesn't save the page.
+        """
+        for file_type in self.FILE_TYPES:
+            size = sha1 = None
+            path = getattr(self, '%s_abs_filename' % file_type)
+            if path:
+                try:
+                    size = os.path.getsize(path)
+                    if checksums:
+                        sha1 = file_sha1(path)
+                except OSError as e:
+                    logging.warning("unable to read %s: %s" % (path, e))
+            if checksums or size != getattr(self, '%s_size' % file_type):
+                setattr(self, '%s_sha1' % file_type, sha1)
+            setattr(self, '%s_size' % file_type, size)
+
     @property
     def noteAboutReproduction(self):
         try:
@@ -810,12 +1005,8 @@ class Page(models.Model):
         date = self.issue.date_issued
         month, day, year  = '%02i'%date.month, '%02i'%date.day, '%04i'%date.year
         date = ''.join([year, month, day])
-        # start with basic title data
-        doc = self.issue.title.solr_doc
-        # no real need to repeat this stuff in pages
-        del doc['essay']
-        del doc['url']
-        del doc['holding_type']
+        # start with the title data page searches need
+        doc = self.issue.title.page_solr_fields
         doc.update({
             'id': self.url,
             'type': 'page',
@@ -846,27 +1037,19 @@ class Page(models.Model):
         """
         return the previous page to this one.
         """
-        previous_page = None
-        pages = list(self.issue.pages.all().order_by("-sequence"))
-        i = pages.index(self)
-        if i >= 0:
-            i += 1
-            if i < len(pages):
-                previous_page = pages[i]
-        return previous_page
+        if not hasattr(self, '_previous_page'):
+            self._previous_page = self.issue.pages.filter(
+                sequence__lt=self.sequence).order_by('-sequence').first()
+        return self._previous_page
 
     def next(self):
         """
         return the next page to this one.
         """
-        next_page = None
-        pages = list(self.issue.pages.all().order_by("sequence"))
-        i = pages.index(self)
-        if i >= 0:
-            i += 1
-            if i < len(pages):
-                next_page = pages[i]
-        return next_page
+        if not hasattr(self, '_next_page'):
+            self._next_page = self.issue.pages.filter(
+                sequence__gt=self.sequence).order_by('sequence').first()
+        return self._next_page
 
     @classmethod
     def lookup(cls, page_id):
@@ -876,7 +1059,7 @@ class Page(models.Model):
         """
 
         # parse out the parts of the id
-        m = re.match(r'/lccn/(.+)/(.+)/ed-(\d+)/seq-(\d+)/?', page_id)
+        m = PAGE_ID_RE.match(page_id)
         if not m:
             return None
         lccn, date, edition, sequence = m.groups()
@@ -892,6 +1075,45 @@ class Page(models.Model):
             return None
         return pages[0]
 
+    @classmethod
+    def lookup_many(cls, page_ids, chunk_size=100):
+        """
+        bulk version of lookup: resolves a list of solr document IDs with one
+        query per chunk_size ids, and returns a dict mapping each id that was
+        found to its Page.  The issue, title, batch and awardee are fetched in
+        the same query so rendering search results doesn't hit the database
+        again for each page.
+        """
+        wanted = {}
+        for page_id in page_ids:
+            m = PAGE_ID_RE.match(page_id)
+            if not m:
+                continue
+            lccn, date, edition, sequence = m.groups()
+            try:
+                date = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+            except ValueError:
+                continue
+            wanted[(lccn, date, int(edition), int(sequence))] = page_id
+
+        found = {}
+        keys = list(wanted.keys())
+        for i in range(0, len(keys), chunk_size):
+            f = Q()
+            for lccn, date, edition, sequence in keys[i:i + chunk_size]:
+                f |= Q(issue__title_id=lccn, issue__date_issued=date,
+                       issue__edition=edition, sequence=sequence)
+            q = Page.objects.filter(f).select_related(
+                'issue__title', 'issue__batch__awardee')
+            for page in q.order_by('-issue__date_issued'):
+                issue = page.issue
+                key = (issue.title_id, issue.date_issued, issue.edition,
+                       page.sequence)
+                if key in wanted:
+                    # keep the first match, like lookup does
+                    found.setdefault(wanted[key], page)
+        return found
+
     def __str__(self):
         parts = ['%s' % self.issue.title]
         parts.append(self.issue.date_issued.strftime('%B %d, %Y'))
@@ -904,6 +1126,8 @@ class Page(models.Model):
 
     class Meta:
         ordering = ('sequence',)
+        # neighbouring page lookups
+        indexes = [models.Index(fields=['issue', 'sequence'])]
 
     class Admin:
         pass
@@ -1324,24 +1548,29 @@ class OcrDump(models.Model):
     def _calculate_sha1(self):
         """looks at the dump file and calculates the sha1 digest and stores it
         """
-        f = open(self.path, "rb")
-        sha1 = hashlib.sha1()
+        self.sha1 = file_sha1(self.path)
+        return self.sha1
+
+
+def file_sha1(path):
+    """Returns the hex SHA-1 digest of the file at path"""
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
         while True:
             buff = f.read(2 ** 16)
             if not buff:
                 break
             sha1.update(buff)
-        self.sha1 = sha1.hexdigest()
-        return self.sha1
+    return sha1.hexdigest()
 
 
-def coordinates_path(url_parts):
+def coordinates_path(url_parts, create=True):
     url = urls.reverse('openoni_page', kwargs=url_parts)
     path = url2pathname(url)
     if path.startswith("/"):
         path = path[1:]
     full_path = os.path.join(settings.COORD_STORAGE, path)
-    if not os.path.exists(full_path):
+    if create and not os.path.exists(full_path):
         os.makedirs(full_path)
     return os.path.join(full_path, "coordinates.json.gz")
 
@@ -63,30 +63,40 @@ class BatchSerializer(serializers.BaseSerializer):
     """
 
     def to_representation(self, instance):
+        # (lccn, date_issued, edition) rows; see api_chronam.batch
+        issues = self.context.get('issues')
+        if issues is None:
+            issues = instance.issues.values_list('title_id', 'date_issued', 'edition').iterator()
         return {
             'awardee': {
                 'name': instance.awardee.name,
                 'url': settings.BASE_URL + instance.awardee.json_url,
             },
             'ingested': rfc3339(instance.created),
-            'issues': [{
-                'date_issued': issue.date_issued.strftime('%Y-%m-%d'),
-                'title': {
-                    'name': issue.title.display_name,
-                    'url': settings.BASE_URL + reverse('api_chronam_title', args=[issue.title.lccn]),
-                },
-                'url': settings.BASE_URL + reverse('api_chronam_issue', args=[
-                    issue.title.lccn,
-                    issue.date_issued.strftime("%Y-%m-%d"),
-                    issue.edition
-                ]),
-            } for issue in instance.issues.all()],
+            'issues': self._issues(issues),
             'lccns': instance.lccns(),
             'name': instance.name,
             'page_count': instance.page_count,
             'url': settings.BASE_URL + reverse('api_chronam_batch', args=[instance.name]),
         }
 
+    def _issues(self, issues):
+        # a batch has issues of only a few titles
+        titles = {}
+        for lccn, date_issued, edition in issues:
+            if lccn not in titles:
+                title = models.Title.objects.get(lccn=lccn)
+                titles[lccn] = ({
+                    'name': title.display_name,
+                    'url': settings.BASE_URL + reverse('api_chronam_title', args=[lccn]),
+                }, models.Issue.url_template('api_chronam_issue', lccn))
+            title, template = titles[lccn]
+            yield {
+                'date_issued': date_issued.strftime('%Y-%m-%d'),
+                'title': title,
+                'url': settings.BASE_URL + models.Issue.format_url(template, date_issued, edition),
+            }
+
 
 class IssueSerializer(serializers.BaseSerializer):
     """
@@ -178,16 +188,17 @@ class TitleSerializer(serializers.BaseSerializer):
     """
 
     def to_representation(self, instance):
+        # (date_issued, edition) rows; see api_chronam.title
+        issues = self.context.get('issues')
+        if issues is None:
+            issues = instance.issues.values_list('date_issued', 'edition').iterator()
+        template = models.Issue.url_template('api_chronam_issue', instance.lccn)
         return {
             'end_year': instance.end_year,
-            'issues': [{
-                'url': settings.BASE_URL + reverse('api_chronam_issue', args=[
-                    i.title.lccn,
-                    i.date_issued.strftime("%Y-%m-%d"),
-                    i.edition
-                ]),
-                'date_issued': i.date_issued.strftime("%Y-%m-%d"),
-            } for i in instance.issues.all()],
+            'issues': ({
+                'url': settings.BASE_URL + models.Issue.format_url(template, date_issued, edition),
+                'date_issued': date_issued.strftime("%Y-%m-%d"),
+            } for date_issued, edition in issues),
             'lccn': instance.lccn,
             'name': instance.display_name,
             'place': [p.name for p in instance.places.all()],
@@ -1,17 +1,30 @@
 import re
+import gzip
+import json
 import math
+import time
+import pickle
+import functools
+import hashlib
 import logging
 import datetime
+import threading
 import pysolr
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlencode, unquote
 
 from django import urls
-from django.core.paginator import Paginator, Page
+from django.core.cache import cache, caches
+from django.core.paginator import Paginator, Page, PageNotAnInteger, EmptyPage
 from django.db import connection, reset_queries
 from django.http import QueryDict
 from django.conf import settings
 
 from core import models
+from core import ocr_extractor
+from core import sqlite_index
 from core.utils.utils import fulltext_range
 from core.utils import utils
 from core.title_loader import _normal_lccn
@@ -20,10 +33,191 @@ _log = logging.getLogger(__name__)
 
 PROX_DISTANCE_DEFAULT = 5
 
+FACET_FIELDS = ['city', 'county', 'frequency', 'language', 'state']
+
 ESCAPE_CHARS_RE = re.compile(r'(?<!\\)(?P<char>[&|+\-!(){}[\]^"~*?:])')
 
+class SolrUnavailable(pysolr.SolrError):
+    """
+    Raised instead of sending a request while the circuit breaker is open,
+    i.e. solr has recently failed too many times in a row.
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Counts consecutive solr failures (connection errors, timeouts and 5xx
+    responses).  Once there have been threshold of them, requests fail
+    immediately with SolrUnavailable for reset_seconds, after which one
+    request is let through to see whether solr has recovered.
+    """
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.time() - self.opened_at < self.reset_seconds:
+                raise SolrUnavailable("Solr is unavailable; not sending requests for up to %ss"
+                                      % self.reset_seconds)
+            # half open: let this request through, but if it fails the
+            # breaker opens again straight away
+            self.opened_at = None
+            self.failures = self.threshold - 1
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened_at is None:
+                _log.error("%d consecutive solr failures; failing fast for %ss",
+                           self.failures, self.reset_seconds)
+                self.opened_at = time.time()
+
+
+class SolrSession(requests.Session):
+    """
+    A requests session that keeps a pool of connections to solr open, retries
+    failed reads and reports to a circuit breaker.
+    """
+
+    def __init__(self, breaker):
+        super(SolrSession, self).__init__()
+        self.breaker = breaker
+        # Retry only retries idempotent methods (i.e., not POST) by default
+        retry = Retry(total=settings.SOLR_RETRIES,
+                      backoff_factor=settings.SOLR_RETRY_BACKOFF,
+                      status_forcelist=(502, 503, 504),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=settings.SOLR_POOL_SIZE,
+                              max_retries=retry)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, *args, **kwargs):
+        self.breaker.before_request()
+        try:
+            response = super(SolrSession, self).request(*args, **kwargs)
+        except requests.exceptions.RequestException:
+            self.breaker.failure()
+            raise
+        if response.status_code >= 500:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        return response
+
+
+_solr = None
+_solr_lock = threading.Lock()
+
+_sqlite_indexes = {}
+
 def conn():
-    return pysolr.Solr(settings.SOLR)
+    """
+    Returns the solr client shared by the whole process, so connections to
+    solr are pooled and reused rather than opened for every query.  With
+    SEARCH_BACKEND = 'sqlite' it's an embedded sqlite_index.SQLiteIndex
+    instead, which takes the same calls.
+    """
+    if settings.SEARCH_BACKEND == 'sqlite':
+        path = str(settings.SEARCH_SQLITE_PATH)
+        with _solr_lock:
+            if path not in _sqlite_indexes:
+                _sqlite_indexes[path] = sqlite_index.SQLiteIndex(path)
+        return _sqlite_indexes[path]
+
+    global _solr
+    if _solr is None:
+        with _solr_lock:
+            if _solr is None:
+                breaker = CircuitBreaker(settings.SOLR_BREAKER_THRESHOLD,
+                                         settings.SOLR_BREAKER_RESET_SECONDS)
+                timeout = (settings.SOLR_CONNECT_TIMEOUT, settings.SOLR_READ_TIMEOUT)
+                _solr = pysolr.Solr(settings.SOLR, timeout=timeout,
+                                    session=SolrSession(breaker))
+    return _solr
+
+INDEX_GENERATION_KEY = 'solr_index_generation'
+INDEX_GENERATION_TIME_KEY = 'solr_index_generation_time'
+
+def index_generation():
+    """
+    Returns the current index generation, which changes whenever the page
+    index or the batches and titles behind it do (see bump_index_generation)
+    so cached searches and responses (see decorator.cache_page) go stale.  If
+    the counter isn't in the cache it starts from the current time, which is
+    later than any generation it could have been before.
+    """
+    generation = cache.get(INDEX_GENERATION_KEY)
+    if generation is None:
+        now = int(time.time())
+        cache.add(INDEX_GENERATION_TIME_KEY, now, None)
+        cache.add(INDEX_GENERATION_KEY, now, None)
+        generation = cache.get(INDEX_GENERATION_KEY, int(time.time()))
+    return generation
+
+def index_generation_time():
+    """
+    Returns when the index generation last changed (or started), as a unix
+    timestamp, or None if that isn't in the cache.
+    """
+    return cache.get(INDEX_GENERATION_TIME_KEY)
+
+def bump_index_generation():
+    """
+    Invalidates all cached searches and responses; call after committing
+    changes to solr or loading or purging data.
+    """
+    try:
+        cache.incr(INDEX_GENERATION_KEY)
+    except ValueError:
+        index_generation()
+    cache.set(INDEX_GENERATION_TIME_KEY, int(time.time()), None)
+
+def results_cache():
+    """
+    Returns the cache that searches and responses (see decorator.cache_page)
+    are kept in: the bounded 'responses' cache, so they don't crowd the
+    index generation and other entries out of the default one, or the
+    default cache for sites whose own CACHES setting has no 'responses'.
+    """
+    return caches['responses' if 'responses' in settings.CACHES else 'default']
+
+def cached_search(q, **params):
+    """
+    Runs a solr search through results_cache(), so identical searches are only
+    sent to solr once per index generation.  Responses bigger than
+    SOLR_SEARCH_CACHE_MAX_BYTES aren't cached, and setting
+    SOLR_SEARCH_CACHE_TTL to 0 turns caching off.
+    """
+    ttl = settings.SOLR_SEARCH_CACHE_TTL
+    if not ttl:
+        return conn().search(q, **params)
+
+    digest = hashlib.md5(repr((q, sorted(params.items()))).encode('utf-8'))
+    key = 'solr_search_%s_%s' % (index_generation(), digest.hexdigest())
+    search_cache = results_cache()
+    data = search_cache.get(key)
+    if data is not None:
+        return pickle.loads(data)
+
+    results = conn().search(q, **params)
+    data = pickle.dumps(results, pickle.HIGHEST_PROTOCOL)
+    if len(data) <= settings.SOLR_SEARCH_CACHE_MAX_BYTES:
+        search_cache.set(key, data, ttl)
+    return results
 
 def page_count():
     return conn().search(q='type:page', rows=0).hits
@@ -55,6 +249,51 @@ def _sorted_facet_counts(solr_counts, field):
 def title_count():
     return conn().search(q='type:title', rows=0).hits
 
+def _api_doc(doc):
+    """
+    Solr stores the page dates as integers; put back the zero-padded strings
+    Page.solr_doc produces so API clients see the same values either way.
+    """
+    for field, width in (('date', 8), ('year', 4), ('month', 2), ('day', 2)):
+        if field in doc:
+            doc[field] = '%0*d' % (width, int(doc[field]))
+    return doc
+
+def _title_api_fields(lccns):
+    """
+    Page documents only carry the title fields searches need (see
+    Title.page_solr_fields); this gets the rest of settings.SOLR_API_FIELDS
+    for each of the given titles from the database, keyed by lccn.
+    """
+    titles = models.Title.objects.filter(lccn__in=set(lccns)) \
+        .select_related('country') \
+        .prefetch_related('languages', 'alt_titles', 'subjects', 'notes',
+                          'places', 'holdings', 'urls', 'essays')
+    fields = {}
+    for title in titles:
+        doc = title.solr_doc
+        fields[title.lccn] = dict((f, doc[f]) for f in settings.SOLR_API_FIELDS
+                                  if f in doc and f not in ('id', 'type'))
+    return fields
+
+def _api_docs(docs, titles=None):
+    """
+    Turns page documents from solr into API results: title fields are added
+    from the database and dates are formatted (see _api_doc).  titles caches
+    the title fields by lccn across calls.
+    """
+    if titles is None:
+        titles = {}
+    missing = set(doc.get('lccn') for doc in docs) - set(titles)
+    if missing:
+        titles.update(_title_api_fields(missing))
+    results = []
+    for doc in docs:
+        for field, value in titles.get(doc.get('lccn'), {}).items():
+            doc.setdefault(field, value)
+        results.append(_api_doc(doc))
+    return results
+
 class SolrPaginator(Paginator):
     """
     SolrPaginator takes a QueryDict object, builds and executes a solr query for
@@ -69,7 +308,7 @@ class SolrPaginator(Paginator):
         if 'words' in self.query:
             del self.query['words']
 
-        self._q, self.facet_params = page_search(self.query)
+        self._q, self._fq, self.facet_params, self._q_params = page_search(self.query)
 
         try:
             self._cur_page = int(self.query.get('page'))
@@ -94,10 +333,24 @@ class SolrPaginator(Paginator):
         self._ocr_list = ['ocr',]
         self._ocr_list.extend(['ocr_%s' % l for l in settings.SOLR_LANGUAGES])
 
+        # when searching one language only its field (and ocr) can match, so
+        # there's no point highlighting the others
+        language = None
+        if self.query.get('language'):
+            language = models.Language.objects.filter(name=self.query['language']).first()
+        if language:
+            self._hl_fields = ['ocr', 'ocr_%s' % language.code]
+        else:
+            self._hl_fields = self._ocr_list
+
+        # solr responses by query, see _search
+        self._responses = {}
+
     def _get_count(self):
         "Returns the total number of objects, across all pages."
         if not hasattr(self, '_count'):
-            self._count = conn().search(self._q, rows=0).hits
+            self._count = cached_search(self._q, fq=self._fq, rows=0,
+                                        **self._q_params).hits
         return self._count
     count = property(_get_count)
 
@@ -117,55 +370,160 @@ class SolrPaginator(Paginator):
         return url + "#" + q.urlencode()
 
     def _get_previous(self):
-        previous_overall_index = self.overall_index - 1
-        if previous_overall_index >= 0:
-            p_page = previous_overall_index // self.per_page + 1
-            p_index = previous_overall_index % self.per_page
-            o = self.page(p_page).object_list[p_index]
-            q = self.query.copy()
-            return self.pagination_url(o.url, o.words, p_page, p_index)
-        else:
-            return None
+        return self.navigation()[0]
     previous_result = property(_get_previous)
 
     def _get_next(self):
-        next_overall_index = self.overall_index + 1
-        if next_overall_index < self.count:
-            n_page = next_overall_index // self.per_page + 1
-            n_index = next_overall_index % self.per_page
-            o = self.page(n_page).object_list[n_index]
-            return self.pagination_url(o.url, o.words, n_page, n_index)
-        else:
-            return None
+        return self.navigation()[1]
     next_result = property(_get_next)
 
-    def page(self, number):
+    def navigation(self):
         """
-        Override the page method in Paginator since Solr has already
-        paginated stuff for us.
+        Returns the urls of the results either side of overall_index (or None
+        where there isn't one), for stepping through results from a page view.
+        Rather than fetching whole result pages, this asks solr for just the
+        ids around the current result, then highlights only the two
+        neighbours to get their words.  The count comes along for free.
         """
+        if hasattr(self, '_navigation'):
+            return self._navigation
 
-        number = self.validate_number(number)
+        start = max(self.overall_index - 1, 0)
+        params = {
+            'fl': 'id',
+            'fq': self._fq,
+            'start': start,
+            'rows': self.overall_index - start + 2,
+        }
+        params.update(self._q_params)
+        self._add_sort(params)
+        solr_response = cached_search(self._q, **params)
+        self._count = solr_response.hits
+
+        ids = [doc['id'] for doc in solr_response.docs]
+        neighbours = {}
+        for overall_index in (self.overall_index - 1, self.overall_index + 1):
+            i = overall_index - start
+            if overall_index >= 0 and i < len(ids):
+                neighbours[overall_index] = ids[i]
+
+        highlighting = self._highlight(list(neighbours.values()))
+        words = {}
+        for page_id in neighbours.values():
+            words[page_id] = self._highlighted_words(highlighting.get(page_id, {}))
+
+        urls = []
+        for overall_index in (self.overall_index - 1, self.overall_index + 1):
+            page_id = neighbours.get(overall_index)
+            if page_id:
+                urls.append(self.pagination_url(
+                    page_id, words[page_id], overall_index // self.per_page + 1,
+                    overall_index % self.per_page))
+            else:
+                urls.append(None)
 
-        # figure out the solr query and execute it
-        start = self.per_page * (number - 1)
+        self._navigation = tuple(urls)
+        return self._navigation
+
+    def _highlight_params(self):
         params = {
-            'fl': 'id,title,date,month,day,sequence,edition_label,section_label',
             'hl': 'true',
-            'hl.snippets': 100, # TODO: make this unlimited
+            'hl.snippets': settings.SOLR_HIGHLIGHT_SNIPPETS,
             'hl.requireFieldMatch': 'true', # limits highlighting slop
             'hl.maxAnalyzedChars': '102400', # increased from default 51200
-            'hl.fl': ','.join(self._ocr_list),
-            'rows': self.per_page,
-            'start': start,
+            'hl.fl': ','.join(self._hl_fields),
         }
-        params.update(self.facet_params)
+        if settings.SOLR_HIGHLIGHT_METHOD:
+            params['hl.method'] = settings.SOLR_HIGHLIGHT_METHOD
+        return params
 
+    def _highlight(self, ids):
+        """
+        Fetches the highlighting for just the given page ids, in one request,
+        so solr only runs its highlighter over the pages we show.
+        """
+        if not ids:
+            return {}
+        params = self._highlight_params()
+        params.update(self._q_params)
+        params['fl'] = 'id'
+        params['fq'] = self._fq + ['{!terms f=id}' + ','.join(ids)]
+        params['rows'] = len(ids)
+        return cached_search(self._q, **params).highlighting
+
+    def _highlighted_words(self, coords):
+        """
+        Returns the sorted, distinct words solr highlighted in a page's OCR
+        fields.
+        """
+        words = set()
+        for ocr in self._ocr_list:
+            for s in coords.get(ocr) or []:
+                words.update(find_words(s))
+        return sorted(words, key=lambda v: v.lower())
+
+    def _search_number(self, number):
+        """
+        Validates a page number as far as possible without knowing how many
+        hits there are, so the hit count can come from the page's own query
+        rather than a separate one.
+        """
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def _add_sort(self, params):
         sort_field, sort_order = _get_sort(self.query.get('sort'), in_pages=True)
         if sort_field and sort_order:
             params['sort'] = '%s %s' % (sort_field, sort_order)
 
-        solr_response = conn().search(self._q, **params)
+    def _search(self, number, **params):
+        """
+        Runs the solr query for the given page number, with any extra solr
+        parameters passed in.  Responses are remembered, so asking for the
+        same page again (e.g. for previous / next results) doesn't go back to
+        solr, and the first response's numFound becomes the paginator's count.
+        """
+        params.update(self._q_params)
+        params['fq'] = self._fq
+        params['rows'] = self.per_page
+        params['start'] = self.per_page * (number - 1)
+
+        self._add_sort(params)
+
+        key = repr(sorted(params.items()))
+        if key not in self._responses:
+            self._responses[key] = cached_search(self._q, **params)
+            if not hasattr(self, '_count'):
+                self._count = self._responses[key].hits
+        return self._responses[key]
+
+    def page(self, number):
+        """
+        Override the page method in Paginator since Solr has already
+        paginated stuff for us.
+        """
+
+        number = self._search_number(number)
+
+        # figure out the solr query and execute it
+        params = {
+            'fl': 'id',
+        }
+        params.update(self.facet_params)
+        lazy_highlighting = settings.SOLR_HIGHLIGHT_MODE == 'lazy'
+        if not lazy_highlighting:
+            params.update(self._highlight_params())
+        solr_response = self._search(number, **params)
+        number = self.validate_number(number)
+        if lazy_highlighting:
+            highlighting = self._highlight([r['id'] for r in solr_response.docs])
+        else:
+            highlighting = solr_response.highlighting
 
         # Gather facet data from the solr response
         solr_facets = solr_response.facets
@@ -183,17 +541,14 @@ class SolrPaginator(Paginator):
         if facet_gap > 1:
             facets['year'] = [('%s-%d' % (y[0], int(y[0])+facet_gap-1), y[1]) 
                               for y in facets['year']]
+        # fetch all the pages at once, keeping the order solr gave us
+        found = models.Page.lookup_many([r['id'] for r in solr_response.docs])
         pages = []
         for result in solr_response.docs:
-            page = models.Page.lookup(result['id'])
+            page = found.get(result['id'])
             if not page:
                 continue
-            words = set()
-            coords = solr_response.highlighting[result['id']]
-            for ocr in self._ocr_list:
-                for s in coords.get(ocr) or []:
-                    words.update(find_words(s))
-            page.words = sorted(words, key=lambda v: v.lower())
+            page.words = self._highlighted_words(highlighting.get(result['id'], {}))
 
             page.highlight_url = self.highlight_url(page.url, page.words)
             pages.append(page)
@@ -202,6 +557,88 @@ class SolrPaginator(Paginator):
         solr_page.facets = facets
         return solr_page
 
+    def docs_page(self, number, include_ocr=False):
+        """
+        Like page, but the object_list holds the documents solr stored
+        (limited to settings.SOLR_API_FIELDS, with title fields filled in by
+        _api_docs) rather than Page models, so API responses only need one
+        database query for the titles.  OCR text is only returned when
+        include_ocr is set.
+        """
+        number = self._search_number(number)
+
+        fields = list(settings.SOLR_API_FIELDS)
+        if include_ocr:
+            fields.append('ocr_*')
+        solr_response = self._search(number, fl=','.join(fields))
+        number = self.validate_number(number)
+        docs = _api_docs(solr_response.docs)
+        return Page(docs, number, self)
+
+    def lookup_page(self, number):
+        """
+        Like page, but without facets or highlighting: only the ids come from
+        solr, and the object_list holds their Page models, looked up in one
+        query, for feeds that need the pages' image paths.
+        """
+        number = self._search_number(number)
+        solr_response = self._search(number, fl='id')
+        number = self.validate_number(number)
+        found = models.Page.lookup_many([doc['id'] for doc in solr_response.docs])
+        pages = [found[doc['id']] for doc in solr_response.docs if doc['id'] in found]
+        return Page(pages, number, self)
+
+    def _cursor_params(self, fields):
+        params = {'fl': ','.join(fields), 'fq': self._fq}
+        params.update(self._q_params)
+        self._add_sort(params)
+        # cursorMark needs the unique key as a tie-breaker
+        params['sort'] = params.get('sort', 'score desc') + ',id asc'
+        return params
+
+    def cursor_page(self, cursor='*', include_ocr=False):
+        """
+        Returns a list of documents like docs_page's object_list, starting at
+        the given cursorMark ('*' for the first page), and the cursorMark for
+        the next page, or None after the last page.  Unlike start offsets,
+        cursors cost solr the same however deep into the results they are.
+        """
+        fields = list(settings.SOLR_API_FIELDS)
+        if include_ocr:
+            fields.append('ocr_*')
+        params = self._cursor_params(fields)
+        params['rows'] = self.per_page
+        params['cursorMark'] = cursor
+        # not through cached_search: pysolr keeps a closure for fetching the
+        # next page on cursor results, which can't be pickled
+        solr_response = conn().search(self._q, **params)
+        self._count = solr_response.hits
+
+        next_cursor = solr_response.nextCursorMark
+        if not solr_response.docs or next_cursor == cursor:
+            next_cursor = None
+        return _api_docs(solr_response.docs), next_cursor
+
+    def export(self):
+        """
+        Generates every document in the results (limited to
+        settings.SOLR_API_FIELDS), fetching SOLR_EXPORT_ROWS at a time with a
+        cursorMark, so a whole result set can be streamed without holding it
+        in memory.
+        """
+        params = self._cursor_params(settings.SOLR_API_FIELDS)
+        params['rows'] = settings.SOLR_EXPORT_ROWS
+        cursor = '*'
+        titles = {}
+        while True:
+            params['cursorMark'] = cursor
+            solr_response = conn().search(self._q, **params)
+            for doc in _api_docs(solr_response.docs, titles):
+                yield doc
+            if not solr_response.docs or solr_response.nextCursorMark == cursor:
+                break
+            cursor = solr_response.nextCursorMark
+
     def pages(self):
         """
         pages creates a list of two element tuples (page_num, url)
@@ -217,10 +654,12 @@ class SolrPaginator(Paginator):
         before = []
         middle = []
         end = []
-        for p in self.page_range:
+        num_pages = self.num_pages
+        for p in utils._page_window(num_pages, (1, 3), (num_pages - 3, num_pages),
+                                    (self._cur_page - 4, self._cur_page + 4)):
             if p <= 3:
                 before.append(p)
-            elif self._num_pages - p <= 3:
+            elif num_pages - p <= 3:
                 end.append(p)
             elif abs(p - self._cur_page) < 5:
                 middle.append(p)
@@ -257,10 +696,16 @@ class SolrPaginator(Paginator):
 
 def page_search(d):
     """
-    Pass in form data for a given page search, and get back
-    a corresponding solr query.
+    Pass in form data for a given page search, and get back a corresponding
+    solr query, a list of filter queries, the facet parameters and any extra
+    parameters the query refers to (see SOLR_OCR_QUERY_MODE).
+
+    Only the full-text clauses go in the query; everything else is a filter
+    query so solr can cache and reuse it across searches.  Filters on faceted
+    fields are tagged so the facet counts can exclude them (multi-select
+    faceting).
     """
-    q = ['+type:page']
+    fq = ['type:page']
 
     simple_fields = ['city', 'county', 'frequency', 
                      'state', 'lccn'
@@ -268,15 +713,82 @@ def page_search(d):
 
     for field in simple_fields:
         if d.get(field, None):
-            q.append(query_join(d.getlist(field), field))
-
-    ocrs = ['ocr_%s' % l for l in settings.SOLR_LANGUAGES]
+            fq.append(_tag_filter(field, query_join(d.getlist(field), field)))
 
     lang_req = d.get('language', None)
     language = models.Language.objects.get(name=lang_req) if lang_req else None
     lang = language.code if language else None
     if language:
-        q.append('+language:%s' % language.name)
+        fq.append(_tag_filter('language', 'language:"%s"' % language.name))
+
+    # the sqlite backend only understands the edismax form
+    if settings.SOLR_OCR_QUERY_MODE == 'edismax' or settings.SEARCH_BACKEND == 'sqlite':
+        q, q_params = _edismax_text_query(d, lang)
+    else:
+        q, q_params = _boolean_text_query(d, lang), {}
+
+    if d.get('sequence', None):
+        fq.append('sequence:"%s"' % d['sequence'])
+    if d.get('issue_date', None):
+        fq.append('+month:%d +day:%d' % (int(d['date_month']), int(d['date_day'])))
+
+    # yearRange supercedes date1 and date2
+
+    year1, year2 = None, None
+
+    year_range = d.get('yearRange', None)
+    if year_range:
+        split = year_range.split("-")
+        if len(split) == 2:
+            year1 = int(split[0])
+            year2 = int(split[1])
+        else:
+            year1 = int(split[0])
+            year2 = int(split[0])
+        fq.append('year:[%d TO %d]' % (year1, year2))
+    else:
+        date_boundaries = fulltext_range()
+        date1 = d.get('date1', None)
+        date2 = d.get('date2', None)
+        if date1 or date2:
+            # do NOT apply year min / max to solr query
+            # do apply it to facets since they require a specific begin / end year
+            d1 = _solrize_date(str(date1), 'start')
+            d2 = _solrize_date(str(date2), 'end')
+
+            fq.append('date:[%s TO %s]' % (d1, d2))
+            year1 = date_boundaries[0] if d1 == "*" else int(str(d1)[:4])
+            year2 = date_boundaries[1] if d2 == "*" else int(str(d2)[:4])
+        else:
+            # do not pass any query parameters to solr if no date requested
+            # but do set the year range for faceting purposes
+            year1 = date_boundaries[0]
+            year2 = date_boundaries[1]
+
+    # choose a facet range gap such that the number of date ranges returned
+    # is <= 10. These would be used to populate a select dropdown on search
+    # results page.
+    gap = max(1, int(math.ceil((year2 - year1)//10)))
+
+    # increment year range end by 1 to be inclusive
+    facet_params = {'facet': 'true','facet.field': [
+                    '{!ex=%s}%s' % (f, f) for f in FACET_FIELDS
+                    ],
+                    'facet.range':'year',
+                    'f.year.facet.range.start': year1,
+                    'f.year.facet.range.end': year2+1,
+                    'f.year.facet.range.gap': gap,
+                    'facet.mincount': 1
+                    }
+    return ' '.join(q) or '*:*', fq, facet_params, q_params
+
+def _boolean_text_query(d, lang):
+    """
+    Build the full-text clauses as one big boolean query that repeats each
+    clause for the ocr field and every ocr_<lang> field.
+    """
+    q = []
+    ocrs = ['ocr_%s' % l for l in settings.SOLR_LANGUAGES]
     ocr_lang = 'ocr_' + lang if lang else 'ocr'
     if d.get('ortext', None):
         q.append('+((' + query_join(_solr_escape(d['ortext']).split(' '), "ocr"))
@@ -322,64 +834,68 @@ def page_search(d):
             for ocr in ocrs:
                 q.append('OR ' + ocr + ':"%s"~%s' % (prox, distance))
         q.append(')')
-    if d.get('sequence', None):
-        q.append('+sequence:"%s"' % d['sequence'])
-    if d.get('issue_date', None):
-        q.append('+month:%d +day:%d' % (int(d['date_month']), int(d['date_day'])))
+    return q
 
-    # yearRange supercedes date1 and date2
-
-    year1, year2 = None, None
-
-    year_range = d.get('yearRange', None)
-    if year_range:
-        split = year_range.split("-")
-        if len(split) == 2:
-            year1 = int(split[0])
-            year2 = int(split[1])
-        else:
-            year1 = int(split[0])
-            year2 = int(split[0])
-        q.append('+year:[%d TO %d]' % (year1, year2))
+def _edismax_text_query(d, lang):
+    """
+    Build the full-text clauses as nested edismax queries.  The OCR fields
+    (and their boosts) are sent once in the ocr_qf parameter and each clause's
+    text in a parameter of its own, rather than repeating every clause for
+    each ocr_<lang> field, so the query stays small no matter how many
+    languages solr is configured for.  Returns the query clauses and the
+    parameters they refer to.
+
+    The pages found are the boolean query's.  Searching one language only
+    queries its field, which the boolean query requires a match in too.
+    An AND search gets a clause per field, ORed, since a single edismax
+    clause over several fields would let its words match in different ones;
+    the other searches need any word, or a phrase, to match in one field,
+    which a single clause already does.  OR and AND searches boost pages
+    where the words also appear together (pf).
+    """
+    if lang:
+        qf = ['ocr_' + lang]
     else:
-        date_boundaries = fulltext_range()
-        date1 = d.get('date1', None)
-        date2 = d.get('date2', None)
-        if date1 or date2:
-            # do NOT apply year min / max to solr query
-            # do apply it to facets since they require a specific begin / end year
-            d1 = _solrize_date(str(date1), 'start')
-            d2 = _solrize_date(str(date2), 'end')
+        qf = ['ocr^10000'] + ['ocr_%s' % l for l in settings.SOLR_LANGUAGES]
+    params = {}
 
-            q.append('+date:[%s TO %s]' % (d1, d2))
-            year1 = date_boundaries[0] if d1 == "*" else int(str(d1)[:4])
-            year2 = date_boundaries[1] if d2 == "*" else int(str(d2)[:4])
-        else:
-            # do not pass any query parameters to solr if no date requested
-            # but do set the year range for faceting purposes
-            year1 = date_boundaries[0]
-            year2 = date_boundaries[1]
+    def words(field):
+        return ' '.join(['"%s"' % w for w in _solr_escape(d[field]).split(' ')])
 
-    # choose a facet range gap such that the number of date ranges returned
-    # is <= 10. These would be used to populate a select dropdown on search
-    # results page.
-    gap = max(1, int(math.ceil((year2 - year1)//10)))
+    if d.get('ortext', None):
+        params['ocr_or'] = words('ortext')
+    if d.get('andtext', None):
+        params['ocr_and'] = words('andtext')
+    if d.get('phrasetext', None):
+        params['ocr_phrase'] = '"%s"' % _solr_escape(d['phrasetext'])
+    if d.get('proxtext', None):
+        distance = d.get('proxdistance', PROX_DISTANCE_DEFAULT)
+        params['ocr_prox'] = '"%s"~%s' % (_solr_escape(d['proxtext']), distance)
+
+    q = []
+    for param in ('ocr_or', 'ocr_and', 'ocr_phrase', 'ocr_prox'):
+        if param not in params:
+            continue
+        if param == 'ocr_and':
+            # every word in the same field, whichever field that is
+            q.append('+(%s)' % ' OR '.join(
+                '_query_:"{!edismax qf=%s pf=%s mm=100%% v=$ocr_and}"' % (field, field)
+                for field in qf))
+        elif param == 'ocr_or':
+            q.append('+_query_:"{!edismax qf=$ocr_qf pf=$ocr_qf mm=1 v=$ocr_or}"')
+        else:
+            q.append('+_query_:"{!edismax qf=$ocr_qf mm=1 v=$%s}"' % param)
+    if set(params) - set(['ocr_and']):
+        params['ocr_qf'] = ' '.join(qf)
+    return q, params
 
-    # increment year range end by 1 to be inclusive
-    facet_params = {'facet': 'true','facet.field': [
-                    'city',
-                    'county',
-                    'frequency',
-                    'language',
-                    'state', 
-                    ],
-                    'facet.range':'year',
-                    'f.year.facet.range.start': year1,
-                    'f.year.facet.range.end': year2+1,
-                    'f.year.facet.range.gap': gap,
-                    'facet.mincount': 1
-                    }
-    return ' '.join(q), facet_params
+def _tag_filter(field, clause):
+    """
+    Tag a filter query on a faceted field so facet.field can exclude it.
+    """
+    if field in FACET_FIELDS:
+        return '{!tag=%s}%s' % (field, clause)
+    return clause
 
 def query_join(values, field, and_clause=False):
     """
@@ -444,6 +960,7 @@ def index_titles(since=None):
             reset_queries()
             solr.commit()
     solr.commit()
+    bump_index_generation()
 
 def index_title(solr, title):
     _log.info("indexing title: lccn=%s" % title.lccn)
@@ -475,12 +992,140 @@ def index_pages():
         if count % 100 == 0:
             reset_queries()
     solr.commit()
+    bump_index_generation()
+
+def index_page_ids(rows=10000):
+    """
+    Generates the id of every page in the index in solr's id order, fetching
+    just the ids, rows at a time, with a cursorMark.
+    """
+    solr = conn()
+    cursor = '*'
+    while True:
+        solr_response = solr.search('type:page', fl='id', sort='id asc',
+                                    rows=rows, cursorMark=cursor)
+        for doc in solr_response.docs:
+            yield doc['id']
+        if not solr_response.docs or solr_response.nextCursorMark == cursor:
+            break
+        cursor = solr_response.nextCursorMark
+
+def database_page_ids(chunk_size=1000):
+    """
+    Generates the index id (URL) of every page index_pages would index, in the
+    same order as index_page_ids.  Issues are read a title at a time and their
+    pages chunk_size issues at a time; only a chunk's ids are sorted in
+    memory, since ids from different titles and dates already sort in the
+    order they're generated.
+    """
+    # an lccn that's a prefix of another still sorts first once the / is on
+    lccns = sorted(models.Title.objects.values_list('lccn', flat=True),
+                   key=lambda lccn: lccn + '/')
+    for lccn in lccns:
+        issues = list(models.Issue.objects.filter(title_id=lccn)
+                      .order_by('date_issued')
+                      .values_list('id', 'date_issued', 'edition'))
+        start = 0
+        while start < len(issues):
+            # don't split a date's issues across chunks: ed-10 sorts before ed-2
+            end = min(start + chunk_size, len(issues))
+            while end < len(issues) and issues[end][1] == issues[end - 1][1]:
+                end += 1
+            issue_urls = {}
+            for issue_id, date, edition in issues[start:end]:
+                issue_urls[issue_id] = urls.reverse('openoni_issue_pages', kwargs={
+                    'lccn': lccn,
+                    'date': "%04i-%02i-%02i" % (date.year, date.month, date.day),
+                    'edition': edition})
+            pages = (models.Page.objects.filter(issue_id__in=issue_urls)
+                     .exclude(ocr_filename=None).exclude(ocr_filename='')
+                     .values_list('issue_id', 'sequence'))
+            ids = ['%sseq-%i/' % (issue_urls[issue_id], sequence)
+                   for issue_id, sequence in pages]
+            ids.sort()
+            for page_id in ids:
+                yield page_id
+            start = end
+
+def _unique_sorted(ids):
+    last = None
+    for i in ids:
+        if last is not None and i < last:
+            raise ValueError('page ids out of order: %s after %s' % (i, last))
+        if i != last:
+            yield i
+        last = i
+
+def diff_page_ids(database_ids, index_ids):
+    """
+    Merges two sorted streams of page ids, such as database_page_ids() and
+    index_page_ids(), and generates (id, in_database) for each id that's only
+    in one of them: in_database is True for pages missing from the index and
+    False for index documents whose page is gone.
+    """
+    database_ids = _unique_sorted(database_ids)
+    index_ids = _unique_sorted(index_ids)
+    db_id = next(database_ids, None)
+    index_id = next(index_ids, None)
+    while db_id is not None or index_id is not None:
+        if index_id is None or (db_id is not None and db_id < index_id):
+            yield db_id, True
+            db_id = next(database_ids, None)
+        elif db_id is None or index_id < db_id:
+            yield index_id, False
+            index_id = next(index_ids, None)
+        else:
+            db_id = next(database_ids, None)
+            index_id = next(index_ids, None)
+
+def _minimal_stem(word):
+    """
+    Strips English plural endings the way solr's EnglishMinimalStemFilter
+    does, e.g. 'buildings' -> 'building', 'cities' -> 'city'.
+    """
+    if len(word) < 3 or word[-1] != 's' or word[-2] in 'us':
+        return word
+    if word[-2] == 'e':
+        if len(word) > 3 and word[-3] == 'i' and word[-4] not in 'ae':
+            return word[:-3] + 'y'
+        if word[-3] in 'iaoe':
+            return word
+    return word[:-1]
+
+def _normalize_word(word):
+    return _minimal_stem(re.sub(ocr_extractor.non_lexemes, '', word).casefold())
+
+@functools.lru_cache(maxsize=1024)
+def _local_word_matches(page_id, words):
+    """
+    Finds the words on a page that match the given normalized words, using
+    the page's word coordinates file rather than solr.  The coordinates are
+    keyed by the words as they appear in the OCR, so the variants of a word
+    are the keys that normalize the same way.  Returns None if the page has
+    no coordinates file.
+    """
+    m = models.PAGE_ID_RE.match(page_id)
+    if not m:
+        return None
+    lccn, date, edition, sequence = m.groups()
+    path = models.coordinates_path(dict(lccn=lccn, date=date, edition=edition,
+                                        sequence=sequence), create=False)
+    try:
+        with gzip.open(path, 'rb') as f:
+            coords = json.loads(f.read().decode('utf-8'))['coords']
+    except (IOError, ValueError, KeyError):
+        return None
+    return tuple(w for w in coords if _normalize_word(w) in words)
 
 def word_matches_for_page(page_id, words):
     """
     Gets a list of pre-analyzed words for a list of words on a particular
     page. So if you pass in 'manufacturer' you can get back a list like
     ['Manufacturer', 'manufacturers', 'MANUFACTURER'] etc ...
+
+    The words are looked up in the page's word coordinates file when there
+    is one, which approximates solr's analysis (case folding and plural
+    stemming); solr is only asked for pages without one.
     """
     # Make sure page_id is of type str, else the following string
     # operation may result in a UnicodeDecodeError. For example, see
@@ -488,6 +1133,13 @@ def word_matches_for_page(page_id, words):
     if not isinstance(page_id, str):
         page_id = str(page_id)
 
+    normalized = frozenset(filter(None, (_normalize_word(w) for w in words)))
+    matches = _local_word_matches(page_id, normalized)
+    if matches is not None:
+        return list(matches)
+    if settings.SEARCH_BACKEND != 'solr':
+        return []
+
     ocr_list = ['ocr',]
     ocr_list.extend(['ocr_%s' % l for l in settings.SOLR_LANGUAGES])
     ocrs = ' OR '.join([query_join(words, o) for o in ocr_list])
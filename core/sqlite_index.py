@@ -0,0 +1,411 @@
+"""
+An embedded search index kept in a SQLite database with an FTS5 full-text
+table, which can stand in for Solr on small collections, laptops and CI (see
+the SEARCH_BACKEND setting).
+
+SQLiteIndex implements the parts of the pysolr client that Open ONI uses
+(add, delete, commit, optimize and search) and understands the queries that
+core.solr_index builds: edismax OCR clauses, filter queries on single fields
+(tagged or not), id lists, facet fields and year ranges, highlighting,
+sorting and cursors.  Searches it can't translate raise pysolr.SolrError.
+
+Full-text matching is approximate: all of a page's OCR goes in one column
+with the porter stemmer, rather than solr's per-language analysis.
+"""
+import re
+import json
+import time
+import sqlite3
+import fnmatch
+import threading
+
+import pysolr
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    doc INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS fields_value ON fields (field, value, doc);
+CREATE INDEX IF NOT EXISTS fields_doc ON fields (doc);
+CREATE VIRTUAL TABLE IF NOT EXISTS ocr USING fts5 (text, tokenize='porter unicode61');
+"""
+
+# fields solr indexes as numbers, so they filter, sort and come back as such
+NUMERIC_FIELDS = ('date', 'year', 'month', 'day', 'sequence', 'start_year', 'end_year')
+
+LOCAL_PARAMS_RE = re.compile(r'^\{!([^}]*)\}(.*)$', re.S)
+CLAUSE_RE = re.compile(r'''
+    \s*([+-]?)(\*|\w+):(
+        \*
+        | \[[^\]]*\]
+        | \((?:[^()"\\]|\\.|"(?:[^"\\]|\\.)*")*\)
+        | "(?:[^"\\]|\\.)*"
+        | (?:[^\s\\]|\\.)+
+    )''', re.X)
+QUOTED_RE = re.compile(r'(\+?)"((?:[^"\\]|\\.)*)"(?:~(\d+))?')
+EDISMAX_RE = re.compile(r'\+?_query_:"\{!edismax ([^}]*)\}"')
+
+
+class SQLiteIndex(object):
+    """
+    A stand-in for pysolr.Solr backed by the SQLite database at path.  Each
+    thread gets its own connection; as with solr, changes are only seen by
+    other connections once committed.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path)
+            db.executescript(SCHEMA)
+            self._local.db = db
+        return db
+
+    # updates
+
+    def add(self, docs, **kwargs):
+        if isinstance(docs, dict):
+            docs = [docs]
+        db = self._db()
+        for doc in docs:
+            self._delete_rowids(db, [r[0] for r in db.execute(
+                'SELECT rowid FROM docs WHERE id = ?', (doc['id'],))])
+            stored = dict((field, _stored_value(field, value))
+                          for field, value in doc.items() if value is not None)
+            rowid = db.execute('INSERT INTO docs (id, data) VALUES (?, ?)',
+                               (doc['id'], json.dumps(stored))).lastrowid
+            rows = []
+            texts = []
+            for field, value in stored.items():
+                values = value if isinstance(value, list) else [value]
+                if field.startswith('ocr'):
+                    texts.extend(values)
+                else:
+                    rows.extend((rowid, field, v) for v in values)
+            db.executemany('INSERT INTO fields (doc, field, value) VALUES (?, ?, ?)', rows)
+            if texts:
+                db.execute('INSERT INTO ocr (rowid, text) VALUES (?, ?)',
+                           (rowid, '\n'.join(texts)))
+
+    def delete(self, id=None, q=None, **kwargs):
+        db = self._db()
+        if id is not None:
+            ids = id if isinstance(id, (list, tuple)) else [id]
+            for i in ids:
+                self._delete_rowids(db, [r[0] for r in db.execute(
+                    'SELECT rowid FROM docs WHERE id = ?', (i,))])
+        if q is not None:
+            where, args = _filter_sql(q)
+            self._delete_rowids(db, [r[0] for r in db.execute(
+                'SELECT d.rowid FROM docs d WHERE %s' % where, args)])
+
+    def _delete_rowids(self, db, rowids):
+        for rowid in rowids:
+            db.execute('DELETE FROM docs WHERE rowid = ?', (rowid,))
+            db.execute('DELETE FROM fields WHERE doc = ?', (rowid,))
+            db.execute('DELETE FROM ocr WHERE rowid = ?', (rowid,))
+
+    def commit(self, **kwargs):
+        self._db().commit()
+
+    def optimize(self, **kwargs):
+        db = self._db()
+        db.execute("INSERT INTO ocr (ocr) VALUES ('optimize')")
+        db.commit()
+        db.execute('VACUUM')
+
+    # searching
+
+    def search(self, q, search_handler=None, **params):
+        t0 = time.time()
+        db = self._db()
+
+        match, where, args = _query_sql(q, params)
+        filters = [_fq_sql(fq) for fq in _as_list(params.get('fq'))]
+        if match:
+            source = 'ocr JOIN docs d ON d.rowid = ocr.rowid'
+            where = ['ocr MATCH ?'] + where
+            args = [match] + args
+        else:
+            source = 'docs d'
+
+        def matching(exclude=()):
+            conditions = list(where)
+            condition_args = list(args)
+            for tag, fq_where, fq_args in filters:
+                if tag not in exclude:
+                    conditions.append(fq_where)
+                    condition_args.extend(fq_args)
+            return ('FROM %s WHERE %s' % (source, ' AND '.join(conditions) or '1'),
+                    condition_args)
+
+        from_where, from_args = matching()
+        hits = db.execute('SELECT COUNT(*) ' + from_where, from_args).fetchone()[0]
+
+        rows = int(params.get('rows', 10))
+        cursor = params.get('cursorMark')
+        # walking the index in id order, the cursor is the last id seen, so
+        # (as with solr) adding and deleting documents along the way doesn't
+        # make it skip any; other cursors are plain offsets
+        by_id = cursor is not None and (params.get('sort') or '').split() == ['id', 'asc']
+        start = 0
+        if by_id:
+            if cursor != '*':
+                from_where += ' AND d.id > ?'
+                from_args = from_args + [cursor]
+        elif cursor is not None:
+            start = 0 if cursor == '*' else int(cursor)
+        else:
+            start = int(params.get('start', 0))
+        results = db.execute(
+            'SELECT d.rowid, d.data, d.id %s ORDER BY %s LIMIT ? OFFSET ?'
+            % (from_where, _order_by(params.get('sort'), match)),
+            from_args + [rows, start]).fetchall()
+
+        fields = _as_list(params.get('fl')) or ['*']
+        fields = [f for fl in fields for f in fl.split(',') if f]
+        docs = []
+        for rowid, data, id in results:
+            data = json.loads(data)
+            docs.append(dict((k, v) for k, v in data.items()
+                             if any(fnmatch.fnmatchcase(k, f) for f in fields)))
+
+        decoded = {
+            'responseHeader': {'status': 0},
+            'response': {'numFound': hits, 'start': start, 'docs': docs},
+        }
+        if by_id:
+            decoded['nextCursorMark'] = results[-1][2] if results else cursor
+        elif cursor is not None:
+            decoded['nextCursorMark'] = str(start + len(docs)) if docs else cursor
+
+        if params.get('hl') in ('true', True) and match:
+            highlighting = {}
+            for rowid, data, id in results:
+                text = db.execute(
+                    "SELECT highlight(ocr, 0, '<em>', '</em>') FROM ocr "
+                    "WHERE ocr MATCH ? AND rowid = ?", (match, rowid)).fetchone()
+                highlighting[id] = {'ocr': [text[0]] if text else []}
+            decoded['highlighting'] = highlighting
+
+        if params.get('facet') in ('true', True):
+            decoded['facet_counts'] = _facets(db, params, matching)
+
+        decoded['responseHeader']['QTime'] = int((time.time() - t0) * 1000)
+        return pysolr.Results(decoded)
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _stored_value(field, value):
+    if isinstance(value, list):
+        return [_stored_value(field, v) for v in value]
+    if field in NUMERIC_FIELDS and isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+def _unescape(value):
+    return re.sub(r'\\(.)', r'\1', value)
+
+
+def _local_params(s):
+    """
+    Splits solr local params off a query, e.g. '{!tag=state}state:"Ohio"' into
+    (None, {'tag': 'state'}, 'state:"Ohio"').  Returns the query parser type,
+    the parameters and the rest of the query.
+    """
+    m = LOCAL_PARAMS_RE.match(s)
+    if not m:
+        return None, {}, s
+    parser = None
+    local = {}
+    for token in m.group(1).split():
+        if '=' in token:
+            key, value = token.split('=', 1)
+            local[key] = value
+        else:
+            parser = token
+    return parser, local, m.group(2)
+
+
+def _fq_sql(fq):
+    """
+    Returns a filter query's tag (if any) and its SQL condition and arguments.
+    """
+    parser, local, query = _local_params(fq)
+    if parser == 'terms':
+        values = [_field_value(local['f'], v) for v in query.split(',')]
+        return (local.get('tag'),) + _values_sql(local['f'], values)
+    if parser is not None:
+        raise pysolr.SolrError('unsupported query parser: %s' % parser)
+    return (local.get('tag'),) + _filter_sql(query)
+
+
+def _filter_sql(query):
+    """
+    Translates a query made of field:value clauses into an SQL condition on
+    docs d.  Every clause must match, as in the queries solr_index builds.
+    """
+    conditions = []
+    args = []
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        m = CLAUSE_RE.match(query, pos)
+        if not m:
+            raise pysolr.SolrError('unsupported query: %s' % query)
+        pos = m.end()
+        while pos < len(query) and query[pos].isspace():
+            pos += 1
+
+        sign, field, value = m.groups()
+        if field == '*' and value == '*':
+            continue
+        if value.startswith('['):
+            low, high = [v.strip() for v in value[1:-1].split(' TO ')]
+            clause = []
+            clause_args = [field]
+            if low != '*':
+                clause.append('value >= ?')
+                clause_args.append(_field_value(field, low))
+            if high != '*':
+                clause.append('value <= ?')
+                clause_args.append(_field_value(field, high))
+            where = ('d.rowid IN (SELECT doc FROM fields WHERE field = ? AND %s)'
+                     % (' AND '.join(clause) or '1'))
+        elif value.startswith('('):
+            terms = QUOTED_RE.findall(value[1:-1])
+            values = [_field_value(field, _unescape(t[1])) for t in terms]
+            if any(t[0] for t in terms):
+                parts = [_values_sql(field, [v]) for v in values]
+                where = ' AND '.join(p[0] for p in parts)
+                clause_args = [a for p in parts for a in p[1]]
+            else:
+                where, clause_args = _values_sql(field, values)
+        else:
+            where, clause_args = _values_sql(
+                field, [_field_value(field, _unescape(value.strip('"')))])
+        if sign == '-':
+            where = 'NOT (%s)' % where
+        conditions.append(where)
+        args.extend(clause_args)
+    return ' AND '.join(conditions) or '1', args
+
+
+def _field_value(field, value):
+    if field in NUMERIC_FIELDS and value.lstrip('-').isdigit():
+        return int(value)
+    return value
+
+
+def _values_sql(field, values):
+    if field == 'id':
+        return 'd.id IN (%s)' % ','.join('?' * len(values)), values
+    return ('d.rowid IN (SELECT doc FROM fields WHERE field = ? AND value IN (%s))'
+            % ','.join('?' * len(values)), [field] + values)
+
+
+def _query_sql(q, params):
+    """
+    Splits the main query into an FTS5 match expression for its edismax OCR
+    clauses (or None) and SQL conditions for anything else.
+    """
+    clauses = EDISMAX_RE.findall(q or '')
+    if not clauses:
+        where, args = _filter_sql(q or '*:*')
+        return None, [where], args
+
+    expressions = []
+    for clause in clauses:
+        local = dict(token.split('=', 1) for token in clause.split() if '=' in token)
+        value = params.get(local['v'].lstrip('$'), '')
+        terms = QUOTED_RE.findall(value)
+        phrases = []
+        for required, text, distance in terms:
+            words = [w for w in re.split(r'\s+', _unescape(text)) if w]
+            if not words:
+                continue
+            quoted = ['"%s"' % w.replace('"', '""') for w in words]
+            if distance:
+                phrases.append('NEAR(%s, %s)' % (' '.join(quoted), distance))
+            else:
+                phrases.append('"%s"' % ' '.join(words).replace('"', '""'))
+        if phrases:
+            operator = ' AND ' if local.get('mm') == '100%' else ' OR '
+            expression = '(%s)' % operator.join(phrases)
+            # an AND search has a clause per OCR field, all one text here
+            if expression not in expressions:
+                expressions.append(expression)
+    if not expressions:
+        return None, ['0'], []
+    return ' AND '.join(expressions), [], []
+
+
+def _order_by(sort, match):
+    order = []
+    for part in (sort or ('score desc' if match else '')).split(','):
+        if not part.strip():
+            continue
+        field, direction = (part.split() + ['asc'])[:2]
+        direction = 'DESC' if direction.lower() == 'desc' else 'ASC'
+        if field == 'score':
+            if match:
+                # bm25() is lower for better matches
+                order.append('bm25(ocr) %s' % ('ASC' if direction == 'DESC' else 'DESC'))
+        elif field == 'id':
+            order.append('d.id %s' % direction)
+        else:
+            order.append("json_extract(d.data, '$.%s') %s" % (re.sub(r'\W', '', field), direction))
+    order.append('d.rowid ASC')
+    return ', '.join(order)
+
+
+def _facets(db, params, matching):
+    mincount = int(params.get('facet.mincount', 0))
+    limit = int(params.get('facet.limit', 100))
+
+    facet_fields = {}
+    for facet_field in _as_list(params.get('facet.field')):
+        parser, local, field = _local_params(facet_field)
+        from_where, args = matching(exclude=local.get('ex', '').split(','))
+        counts = db.execute(
+            'SELECT value, COUNT(DISTINCT doc) FROM fields WHERE field = ? '
+            'AND doc IN (SELECT d.rowid %s) GROUP BY value HAVING COUNT(DISTINCT doc) >= ? '
+            'ORDER BY COUNT(DISTINCT doc) DESC, value LIMIT ?' % from_where,
+            [field] + args + [mincount, limit])
+        facet_fields[field] = [x for value, count in counts for x in (str(value), count)]
+
+    facet_ranges = {}
+    for field in _as_list(params.get('facet.range')):
+        start = int(params.get('f.%s.facet.range.start' % field))
+        end = int(params.get('f.%s.facet.range.end' % field))
+        gap = int(params.get('f.%s.facet.range.gap' % field))
+        from_where, args = matching()
+        counts = dict(db.execute(
+            'SELECT (value - ?) / ?, COUNT(DISTINCT doc) FROM fields WHERE field = ? '
+            'AND value >= ? AND value < ? AND doc IN (SELECT d.rowid %s) GROUP BY 1'
+            % from_where,
+            [start, gap, field, start, start + gap * -(-(end - start) // gap)] + args))
+        buckets = []
+        for i, bucket in enumerate(range(start, end, gap)):
+            if counts.get(i, 0) >= mincount:
+                buckets.extend([str(bucket), counts.get(i, 0)])
+        facet_ranges[field] = {'counts': buckets, 'gap': gap, 'start': start, 'end': end}
+
+    return {'facet_queries': {}, 'facet_fields': facet_fields, 'facet_ranges': facet_ranges}
@@ -1,6 +1,14 @@
+import os
 import json
+import datetime
+from unittest import mock
 
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core import models
 
 
 class ApiIiifTests(TestCase):
@@ -19,6 +27,11 @@ class ApiIiifTests(TestCase):
       'test/titles.json'
     ]
 
+    @classmethod
+    def setUpTestData(cls):
+        # the batch loader keeps these up to date
+        call_command('update_counts', stdout=open(os.devnull, 'w'))
+
     def test_newspaper_json(self):
         r = self.client.get('/newspapers.json')
         self.assertEqual(r.status_code, 200)
@@ -36,7 +49,7 @@ class ApiIiifTests(TestCase):
     def test_title_json(self):
         r = self.client.get('/lccn/sn83030214.json')
         self.assertEqual(r.status_code, 200)
-        j = json.loads(r.content)
+        j = json.loads(r.getvalue())
         self.maxDiff = None
         self.assertEqual(j,
             {'@context': 'http://iiif.io/api/presentation/2/context.json',
@@ -187,7 +200,7 @@ class ApiIiifTests(TestCase):
     def test_batch_json(self):
         r = self.client.get('/batches/batch_curiv_ahwahnee_ver01.json')
         self.assertEqual(r.status_code, 200)
-        j = json.loads(r.content)
+        j = json.loads(r.getvalue())
         self.maxDiff = None
         self.assertEqual(j,
             {'@context': 'http://iiif.io/api/presentation/2/context.json',
@@ -285,7 +298,7 @@ class ApiChronamTests(TestCase):
 
         r = self.client.get('/api/chronam/batches/batch_curiv_ahwahnee_ver01.json')
         self.assertEqual(r.status_code, 200)
-        j = json.loads(r.content)
+        j = json.loads(r.getvalue())
         self.assertEqual(j['name'], 'batch_curiv_ahwahnee_ver01')
         self.assertEqual(j['page_count'], 1)
         self.assertEqual(j['awardee']['name'], 'University of California, Riverside')
@@ -455,7 +468,7 @@ class ApiChronamTests(TestCase):
 
         r = self.client.get('/api/chronam/lccn/sn83030214.json')
         self.assertEqual(r.status_code, 200)
-        j = json.loads(r.content)
+        j = json.loads(r.getvalue())
         self.assertEqual(j['place_of_publication'], 'New York [N.Y.]')
         self.assertEqual(j['lccn'], 'sn83030214')
         self.assertEqual(j['start_year'], '1866')
@@ -464,3 +477,56 @@ class ApiChronamTests(TestCase):
         self.assertTrue(j['url'].endswith('/lccn/sn83030214.json'))
         self.assertEqual(j['subject'][0], 'New York (N.Y.)--Newspapers.')
         self.assertEqual(j['issues'][0]['date_issued'], '1898-01-01')
+
+
+class IssueListTests(TestCase):
+    """
+    Title and batch documents list their issues as they're streamed out
+    """
+
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/many_pages.json']
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            j = json.loads(r.getvalue())
+        return j, len(queries)
+
+    def add_issues(self):
+        issue = models.Issue.objects.first()
+        for day in range(1, 31):
+            models.Issue.objects.create(title=issue.title, batch=issue.batch,
+                                        date_issued=datetime.date(1899, 1, day),
+                                        edition=1)
+        return issue.batch
+
+    def test_queries(self):
+        batch = models.Issue.objects.first().batch
+        urls = ('/lccn/sn83030214.json', '/batches/%s.json' % batch.name,
+                '/api/chronam/lccn/sn83030214.json', '/api/chronam/batches/%s.json' % batch.name)
+        counts = [self.get(url)[1] for url in urls]
+        self.add_issues()
+        self.assertEqual(counts, [self.get(url)[1] for url in urls])
+
+        j, queries = self.get('/api/chronam/lccn/sn83030214.json')
+        self.assertEqual(models.Issue.objects.count(), len(j['issues']))
+        self.assertTrue(j['issues'][-1]['url'].endswith('/api/chronam/lccn/sn83030214/1899-01-30/ed-1.json'))
+        j, queries = self.get('/lccn/sn83030214.json')
+        self.assertTrue(j['manifests'][-1]['@id'].endswith('/lccn/sn83030214/1899-01-30/ed-1.json'))
+
+    def test_pages(self):
+        batch = self.add_issues()
+        j, queries = self.get('/api/chronam/batches/%s.json?page=1' % batch.name)
+        self.assertEqual(batch.issues.count(), j['count'])
+        self.assertEqual(1, j['pages'])
+        self.assertNotIn('next', j)
+        r = self.client.get('/api/chronam/lccn/sn83030214.json?page=2')
+        self.assertEqual(r.status_code, 400)
+
+        with mock.patch('core.views.api_chronam.ISSUES_PER_PAGE', 10):
+            j, queries = self.get('/api/chronam/lccn/sn83030214.json?page=2')
+        self.assertEqual(10, len(j['issues']))
+        self.assertTrue(j['next'].endswith('/api/chronam/lccn/sn83030214.json?page=3'))
+        self.assertTrue(j['previous'].endswith('/api/chronam/lccn/sn83030214.json?page=1'))
@@ -98,19 +98,13 @@ class BatchLoaderTest(TestCase):
         self.assertEqual(solr_doc['type'], 'page')
         self.assertEqual(solr_doc['sequence'], 1)
         self.assertEqual(solr_doc['lccn'], 'sn83030214')
-        self.assertEqual(solr_doc['title'], 'New-York tribune.')
         self.assertEqual(solr_doc['date'], '19990615')
         self.assertEqual(solr_doc['batch'], 'batch_oru_testbatch_ver01')
-        self.assertEqual(solr_doc['subject'], [
-            'New York (N.Y.)--Newspapers.',
-            'New York County (N.Y.)--Newspapers.'])
-        self.assertEqual(solr_doc['place'], [
-            'New York--Brooklyn--New York City', 
-            'New York--Queens--New York City'])
-        self.assertEqual(solr_doc['note'], [
-            "I'll take Manhattan",
-            'The Big Apple'])
-        self.assertTrue('essay' not in solr_doc)
+        self.assertEqual(solr_doc['county'], ['Brooklyn', 'Queens'])
+        self.assertEqual(solr_doc['state'], ['New York', 'New York'])
+        # title display fields stay in the title's document
+        for field in ('title', 'subject', 'place', 'note', 'essay'):
+            self.assertTrue(field not in solr_doc)
         self.assertEqual(solr_doc['ocr_eng'], 'LCCNsn83030214Page1')
 
         # purge the batch and make sure it's gone from the db
@@ -0,0 +1,125 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+
+from core import decorator, models, solr_index
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BrowseTests(TestCase):
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/many_pages.json']
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.get(url)
+        self.assertEqual(200, r.status_code)
+        return r, len(queries)
+
+    def test_issues_first_pages(self):
+        r, queries = self.get('/lccn/sn83030214/issues/first_pages/')
+        first_pages = r.context['page'].object_list
+        self.assertEqual(20, len(first_pages))
+        for info in first_pages:
+            self.assertEqual(info['issue'].pages.first(), info['page'])
+
+        # more issues (without pages) don't mean more queries
+        issue = models.Issue.objects.first()
+        for day in range(1, 31):
+            models.Issue.objects.create(title=issue.title, batch=issue.batch,
+                                        date_issued=datetime.date(1899, 1, day),
+                                        edition=1)
+        r, more_queries = self.get('/lccn/sn83030214/issues/first_pages/')
+        self.assertEqual(queries, more_queries)
+        self.assertEqual(3, r.context['paginator'].num_pages)
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.get('/lccn/sn83030214/issues/first_pages/3/')
+        self.assertEqual([None] * 17, [i['page'] for i in r.context['page'].object_list])
+        # the last page already has the latest issue, so only the template's
+        # "View Last Issue" link looks it up
+        self.assertEqual(issue.title.last_issue.date_issued, r.context['issue'].date_issued)
+        self.assertEqual(1, len([q for q in queries if '"date_issued" DESC' in q['sql']]))
+
+    def test_issue_pages(self):
+        r, queries = self.get('/lccn/sn83030214/1898-01-15/ed-1/')
+        pages = r.context['page'].object_list
+        issue = models.Issue.objects.get(date_issued='1898-01-15')
+        self.assertEqual(list(issue.pages.all()), [p['page'] for p in pages])
+        self.assertEqual([issue] * len(pages), [p['issue'] for p in pages])
+
+
+@override_settings(RESPONSE_CACHE=True, RESPONSE_CACHE_STATS=True, CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'response-cache-tests'},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                  'LOCATION': 'response-cache-tests-responses'}})
+class ResponseCacheTests(TestCase):
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/issue.json', 'test/batch.json', 'test/page.json', 'test/reel.json']
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+
+    def test_cache(self):
+        url = '/lccn/sn83030214/1898-01-01/ed-1.json'
+        r = self.client.get(url)
+        self.assertEqual('MISS', r['X-Cache'])
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual('HIT', cached['X-Cache'])
+        self.assertEqual(r.content, cached.content)
+        # responses don't crowd out the default cache's entries
+        self.assertFalse([k for k in cache._cache if 'views.decorators.cache' in k])
+
+        # each query string is cached separately
+        self.assertEqual('MISS', self.client.get(url + '?x=1')['X-Cache'])
+
+        solr_index.bump_index_generation()
+        self.assertEqual('MISS', self.client.get(url)['X-Cache'])
+        self.assertEqual((1, 3), decorator.response_cache_stats())
+
+    def test_opt_out(self):
+        with self.settings(SOLR_SEARCH_CACHE_TTL=0):
+            r = self.client.get('/search/pages/navigation/')
+        self.assertEqual(404, r.status_code)
+        self.assertNotIn('X-Cache', r)
+
+    def test_conditional_get(self):
+        url = '/lccn/sn83030214/1898-01-01/ed-1.json'
+        r = self.client.get(url)
+        self.assertIn('ETag', r)
+        self.assertIn('Last-Modified', r)
+
+        # revalidating skips the view and the response cache
+        with self.assertNumQueries(0):
+            r = self.client.get(url, HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(304, r.status_code)
+        self.assertEqual((0, 1), decorator.response_cache_stats())
+
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(etag, self.client.get(url + '?x=1')['ETag'])
+        solr_index.bump_index_generation()
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, r.status_code)
+        self.assertNotEqual(etag, r['ETag'])
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_home_revalidates_by_date(self):
+        r = self.client.get('/')
+        self.assertNotIn('Last-Modified', r)
+        self.assertNotIn('X-Cache', r)
+
+        # the next day, revalidating yesterday's home page runs the view
+        # again, so only an unchanged page can be "not modified"
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        with mock.patch('core.views.home.datetime') as home_datetime:
+            home_datetime.date.today.return_value = tomorrow
+            r = self.client.get('/', HTTP_IF_NONE_MATCH=r['ETag'],
+                                HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(tomorrow.replace(year=tomorrow.year - 100), r.context['date'])
@@ -0,0 +1,151 @@
+import io
+import os
+import hashlib
+import datetime
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core import models
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'model-tests'}})
+class IssueNavigationTests(TestCase):
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/many_pages.json']
+
+    def setUp(self):
+        self.issue = models.Issue.objects.get(date_issued='1898-01-15')
+        models.Issue.reset_navigation(self.issue.title_id)
+
+    def add_issue(self, date, edition=1):
+        return models.Issue.objects.create(
+            title=self.issue.title, batch=self.issue.batch,
+            date_issued=date, edition=edition)
+
+    def test_previous_next(self):
+        with self.assertNumQueries(3):
+            self.assertEqual(datetime.date(1898, 1, 8), self.issue.previous.date_issued)
+            self.assertEqual(datetime.date(1898, 1, 22), self.issue.next.date_issued)
+            self.assertEqual(datetime.date(1898, 1, 8), self.issue.previous.date_issued)
+
+        first = models.Issue.objects.get(date_issued='1898-01-01')
+        self.assertIsNone(first.previous)
+
+    def test_deleted_neighbours(self):
+        # cache the navigation, then delete the neighbours without Issue.delete
+        self.issue.neighbour_first_pages()
+        models.Issue.objects.filter(date_issued__in=['1898-01-08', '1898-01-22']).delete()
+
+        issue = models.Issue.objects.get(pk=self.issue.pk)
+        self.assertEqual(datetime.date(1898, 1, 1), issue.previous.date_issued)
+        self.assertEqual(datetime.date(1898, 1, 29), issue.next.date_issued)
+        previous, next = issue.neighbour_first_pages()
+        self.assertEqual(datetime.date(1898, 1, 1), previous.issue.date_issued)
+
+    def test_skips_duplicates_and_empty_issues(self):
+        # a duplicate of the issue, another edition and an issue without pages
+        self.add_issue(self.issue.date_issued)
+        edition = self.add_issue(self.issue.date_issued, 2)
+        empty = self.add_issue(datetime.date(1898, 1, 20))
+
+        self.assertEqual(edition, self.issue.next)
+        previous, next = self.issue.neighbour_first_pages()
+        self.assertEqual((datetime.date(1898, 1, 8), 1),
+                         (previous.issue.date_issued, previous.sequence))
+        self.assertEqual((datetime.date(1898, 1, 22), 1),
+                         (next.issue.date_issued, next.sequence))
+
+        self.assertEqual(edition, empty.previous)
+        with self.assertNumQueries(1):
+            self.assertEqual(next, empty.neighbour_first_pages()[1])
+
+
+class PageNavigationTests(TestCase):
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/many_pages.json']
+
+    def test_previous_next(self):
+        issue = models.Issue.objects.get(date_issued='1898-01-15')
+        first, second, third = issue.pages.all()[:3]
+        # a gap in the sequence numbers
+        second.delete()
+
+        with self.assertNumQueries(2):
+            self.assertEqual(first, third.previous())
+            self.assertEqual(third, first.next())
+            self.assertEqual(first, third.previous())
+        self.assertIsNone(first.previous())
+        self.assertIsNone(issue.pages.last().next())
+
+
+class PageFilesTests(TestCase):
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/issue.json', 'test/batch.json', 'test/page.json', 'test/reel.json']
+
+    def setUp(self):
+        storage = tempfile.TemporaryDirectory()
+        self.addCleanup(storage.cleanup)
+        override = self.settings(BATCH_STORAGE=storage.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.page = models.Page.objects.get(pk=1)
+        os.makedirs(os.path.dirname(self.page.jp2_abs_filename))
+        for filename, data in ((self.page.jp2_abs_filename, b'jp2 data'),
+                               (self.page.ocr_abs_filename, b'<xml/>')):
+            with open(filename, 'wb') as f:
+                f.write(data)
+
+    def test_record_files(self):
+        self.page.record_files()
+        self.assertEqual((None, 8, None, 6),
+                         (self.page.tiff_size, self.page.jp2_size,
+                          self.page.pdf_size, self.page.ocr_size))
+        self.assertIsNone(self.page.jp2_sha1)
+
+        self.page.record_files(checksums=True)
+        self.assertEqual(hashlib.sha1(b'jp2 data').hexdigest(), self.page.jp2_sha1)
+        self.assertIsNone(self.page.tiff_sha1)
+
+        # an unchanged file keeps its digest, a changed one loses it
+        self.page.record_files()
+        self.assertEqual(hashlib.sha1(b'jp2 data').hexdigest(), self.page.jp2_sha1)
+        with open(self.page.jp2_abs_filename, 'wb') as f:
+            f.write(b'new jp2 data')
+        self.page.record_files()
+        self.assertEqual(12, self.page.jp2_size)
+        self.assertIsNone(self.page.jp2_sha1)
+
+    def test_record_page_files(self):
+        out = io.StringIO()
+        call_command('record_page_files', stdout=out)
+        self.assertIn('recorded files for 3 pages', out.getvalue())
+        self.assertEqual(8, models.Page.objects.get(pk=1).jp2_size)
+
+        # pages with sizes recorded are skipped
+        out = io.StringIO()
+        call_command('record_page_files', stdout=out)
+        self.assertIn('recorded files for 2 pages', out.getvalue())
+
+
+class CountsTests(TestCase):
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/many_pages.json']
+
+    def test_update_counts(self):
+        out = io.StringIO()
+        call_command('update_counts', stdout=out)
+        self.assertIn('updated counts for 3 batches and 1 titles', out.getvalue())
+
+        batches = list(models.Batch.objects.order_by('name'))
+        self.assertEqual([['sn83030214']] * 3, [b.lccns() for b in batches])
+        self.assertEqual(108, sum(b.page_count for b in batches))
+        self.assertEqual(models.Issue.objects.count(), sum(b.issue_count for b in batches))
+        self.assertEqual(models.Issue.objects.count(),
+                         models.Title.objects.get(lccn='sn83030214').issue_count)
+        awardee = batches[0].awardee
+        with self.assertNumQueries(1):
+            self.assertEqual(108, awardee.page_count)
@@ -1,8 +1,20 @@
+import gzip
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+import pysolr
+import requests
+
+from django.core.cache import caches
 from django.test import TestCase
 from django.conf import settings
 from django.http import QueryDict as Q
+from django.test import override_settings
 from django.utils import timezone
 
+from core import models
 from core import solr_index as si
 
 class SolrIndexTests(TestCase):
@@ -40,6 +52,105 @@ class SolrIndexTests(TestCase):
             'for'])
 
 
+    # conn / CircuitBreaker
+
+    def test_conn_is_shared(self):
+        self.assertIs(si.conn(), si.conn())
+        self.assertIsInstance(si.conn().get_session(), si.SolrSession)
+
+    def test_circuit_breaker(self):
+        breaker = si.CircuitBreaker(threshold=2, reset_seconds=60)
+        breaker.failure()
+        breaker.before_request()
+        breaker.success()
+        breaker.failure()
+        breaker.before_request()
+        breaker.failure()
+        self.assertRaises(si.SolrUnavailable, breaker.before_request)
+
+        # once the reset time has passed, one request is tried again, and if
+        # that fails the breaker opens right away
+        breaker.opened_at -= 60
+        breaker.before_request()
+        breaker.failure()
+        self.assertRaises(si.SolrUnavailable, breaker.before_request)
+
+    @override_settings(SOLR_RETRIES=0)
+    def test_session_opens_breaker(self):
+        breaker = si.CircuitBreaker(threshold=2, reset_seconds=60)
+        session = si.SolrSession(breaker)
+        for i in range(2):
+            self.assertRaises(requests.exceptions.ConnectionError,
+                              session.get, 'http://127.0.0.1:1/solr/select')
+        self.assertRaises(si.SolrUnavailable,
+                          session.get, 'http://127.0.0.1:1/solr/select')
+
+    # word_matches_for_page
+
+    def test_minimal_stem(self):
+        for word, stem in (('buildings', 'building'), ('cities', 'city'),
+                           ('bus', 'bus'), ('class', 'class'), ('toes', 'toes'),
+                           ('horses', 'horse'), ('is', 'is'), ('news', 'new')):
+            self.assertEqual(stem, si._minimal_stem(word))
+
+    def test_word_matches_from_coordinates(self):
+        coord_storage = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, coord_storage)
+        with override_settings(COORD_STORAGE=coord_storage):
+            url_parts = dict(lccn='sn83030214', date='1898-01-01',
+                             edition='1', sequence='1')
+            coords = {'Building': [], 'BUILDINGS': [], 'build': [],
+                      'Cities': [], 'city': [], 'fire': []}
+            with gzip.open(models.coordinates_path(url_parts), 'wb') as f:
+                f.write(json.dumps({'coords': coords}).encode('utf-8'))
+
+            page_id = '/lccn/sn83030214/1898-01-01/ed-1/seq-1/'
+            self.assertEqual(['BUILDINGS', 'Building'], sorted(
+                si.word_matches_for_page(page_id, ['buildings'])))
+            self.assertEqual(['Cities', 'city'], sorted(
+                si.word_matches_for_page(page_id, ['"City,"', 'water'])))
+            self.assertEqual([], si.word_matches_for_page(page_id, ['water']))
+        si._local_word_matches.cache_clear()
+
+    # search cache
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_index_generation(self):
+        generation = si.index_generation()
+        self.assertEqual(generation, si.index_generation())
+        si.bump_index_generation()
+        self.assertEqual(generation + 1, si.index_generation())
+
+    @override_settings(SOLR_SEARCH_CACHE_TTL=60, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': 'search-cache-tests'},
+        'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                      'LOCATION': 'search-cache-tests-responses'}})
+    def test_cached_search(self):
+        response = json.dumps({'response': {'numFound': 3, 'docs': []}})
+        with mock.patch.object(pysolr.Solr, '_select', return_value=response) as select:
+            self.assertEqual(3, si.cached_search('type:page', rows=0).hits)
+            self.assertEqual(3, si.cached_search('type:page', rows=0).hits)
+        self.assertEqual(1, select.call_count)
+        # searches are kept out of the default cache, with the generation
+        self.assertEqual([], [k for k in caches['default']._cache if 'solr_search' in k])
+        self.assertTrue([k for k in caches['responses']._cache if 'solr_search' in k])
+
+
+    # _api_doc
+
+    def test_api_doc(self):
+        doc = si._api_doc({'id': '/lccn/sn83030214/1898-01-01/ed-1/seq-1/',
+            'date': 18980101, 'year': 1898, 'month': 1, 'day': 1,
+            'sequence': 1})
+        self.assertEqual(doc['date'], '18980101')
+        self.assertEqual(doc['year'], '1898')
+        self.assertEqual(doc['month'], '01')
+        self.assertEqual(doc['day'], '01')
+        self.assertEqual(doc['sequence'], 1)
+
+
     # _get_sort
 
     def test_get_sort(self):
@@ -64,6 +175,26 @@ class SolrIndexTests(TestCase):
         si.index_pages()
         self.assertEqual(si.page_count(), 2)
 
+
+    # audit_index
+
+    def test_database_page_ids(self):
+        pages = models.Page.objects.exclude(ocr_filename=None).exclude(ocr_filename='')
+        self.assertEqual(sorted(p.url for p in pages),
+                         list(si.database_page_ids(chunk_size=1)))
+
+    def test_diff_page_ids(self):
+        db = ['/lccn/a/1900-01-01/ed-1/seq-1/', '/lccn/a/1900-01-01/ed-1/seq-2/',
+              '/lccn/a/1900-01-01/ed-1/seq-2/', '/lccn/b/1900-01-01/ed-1/seq-1/']
+        index = ['/lccn/a/1900-01-01/ed-1/seq-2/', '/lccn/a1/1900-01-01/ed-1/seq-1/']
+        self.assertEqual([
+            ('/lccn/a/1900-01-01/ed-1/seq-1/', True),
+            ('/lccn/a1/1900-01-01/ed-1/seq-1/', False),
+            ('/lccn/b/1900-01-01/ed-1/seq-1/', True),
+        ], list(si.diff_page_ids(iter(db), iter(index))))
+        with self.assertRaises(ValueError):
+            list(si.diff_page_ids(iter(reversed(db)), iter(index)))
+
     # page_count
 
     # TODO the below is pulling data from my development environment
@@ -76,73 +207,145 @@ class SolrIndexTests(TestCase):
     # page_search
 
     def test_page_search_lccn(self):
-        self.assertEqual(si.page_search(Q('lccn=sn83030214'))[0],
-            '+type:page +lccn:("sn83030214")')
-        self.assertEqual(si.page_search(Q('lccn=sn83030214&lccn=sn83030215'))[0],
-            '+type:page +lccn:("sn83030214" "sn83030215")')
+        self.assertEqual(si.page_search(Q('lccn=sn83030214'))[:2],
+            ('*:*', ['type:page', '+lccn:("sn83030214")']))
+        self.assertEqual(si.page_search(Q('lccn=sn83030214&lccn=sn83030215'))[1],
+            ['type:page', '+lccn:("sn83030214" "sn83030215")'])
 
     def test_page_search_state(self):
-        self.assertEqual(si.page_search(Q('state=California'))[0],
-            '+type:page +state:("California")')
-        self.assertEqual(si.page_search(Q('state=California&state=New Jersey'))[0],
-            '+type:page +state:("California" "New Jersey")')
+        self.assertEqual(si.page_search(Q('state=California'))[:2],
+            ('*:*', ['type:page', '{!tag=state}+state:("California")']))
+        self.assertEqual(si.page_search(Q('state=California&state=New Jersey'))[1],
+            ['type:page', '{!tag=state}+state:("California" "New Jersey")'])
 
     def test_page_search_year(self):
-        self.assertEqual(si.page_search(Q('yearRange=1900'))[0],
-            '+type:page +year:[1900 TO 1900]')
+        self.assertEqual(si.page_search(Q('yearRange=1900'))[1],
+            ['type:page', 'year:[1900 TO 1900]'])
 
     def test_page_search_year_range(self):
-        self.assertEqual(si.page_search(Q('yearRange=1900-1915'))[0],
-            '+type:page +year:[1900 TO 1915]')
+        self.assertEqual(si.page_search(Q('yearRange=1900-1915'))[1],
+            ['type:page', 'year:[1900 TO 1915]'])
 
     def test_page_search_date_range(self):
         self.assertEqual(
-            si.page_search(Q('date1=1901-10-25&date2=1901-10-31'))[0],
-            '+type:page +date:[19011025 TO 19011031]')
+            si.page_search(Q('date1=1901-10-25&date2=1901-10-31'))[1],
+            ['type:page', 'date:[19011025 TO 19011031]'])
 
     def test_page_search_date1_only(self):
         self.assertEqual(
-            si.page_search(Q('date1=1988-05-30&date2='))[0],
-            '+type:page +date:[19880530 TO *]')
+            si.page_search(Q('date1=1988-05-30&date2='))[1],
+            ['type:page', 'date:[19880530 TO *]'])
 
     def test_page_search_date2_only(self):
         self.assertEqual(
-            si.page_search(Q('date2=1880-01-07'))[0],
-            '+type:page +date:[* TO 18800107]')
+            si.page_search(Q('date2=1880-01-07'))[1],
+            ['type:page', 'date:[* TO 18800107]'])
 
     def test_page_search_year_range_and_dates(self):
         self.assertEqual(
-            si.page_search(Q('date1=1900-01-01&date2=1910-12-31&yearRange=1902-1904'))[0],
-            '+type:page +year:[1902 TO 1904]')
+            si.page_search(Q('date1=1900-01-01&date2=1910-12-31&yearRange=1902-1904'))[1],
+            ['type:page', 'year:[1902 TO 1904]'])
 
     def test_page_search_no_date(self):
         self.assertEqual(
-            si.page_search(Q('date1&date2'))[0],
-            '+type:page')
+            si.page_search(Q('date1&date2'))[:2],
+            ('*:*', ['type:page']))
+
+    def test_page_search_facets(self):
+        facet_params = si.page_search(Q('state=California'))[2]
+        self.assertIn('{!ex=state}state', facet_params['facet.field'])
 
     # TODO not sure that the or / and / prox / text texts are searching languages correctly
     # see coverage report for page_search function
 
     def test_page_search_ortext(self):
         q = ' OR '.join(['%s:("apples" "oranges")' % lang for lang in self.ocr_langs])
-        self.assertEqual(si.page_search(Q('ortext=apples%20oranges'))[0], '+type:page +((ocr:("apples" "oranges")^10000 ) OR %s )' % q)
+        self.assertEqual(si.page_search(Q('ortext=apples%20oranges'))[0], '+((ocr:("apples" "oranges")^10000 ) OR %s )' % q)
 
     def test_page_search_andtext(self):
         q = ' OR '.join(['%s:(+"apples" +"oranges")' % lang for lang in self.ocr_langs])
-        self.assertEqual(si.page_search(Q('andtext=apples%20oranges'))[0], '+type:page +((ocr:(+"apples" +"oranges")^10000 ) OR %s )' % q)
+        self.assertEqual(si.page_search(Q('andtext=apples%20oranges'))[0], '+((ocr:(+"apples" +"oranges")^10000 ) OR %s )' % q)
 
     def test_page_search_phrase(self):
         q = ' OR '.join(['%s:"new york yankees"' % lang for lang in self.ocr_langs])
-        self.assertEqual(si.page_search(Q('phrasetext=new%20york%20yankees'))[0], '+type:page +((ocr:"new york yankees"^10000 ) OR %s )' % q)
+        self.assertEqual(si.page_search(Q('phrasetext=new%20york%20yankees'))[0], '+((ocr:"new york yankees"^10000 ) OR %s )' % q)
 
     def test_page_search_proxtext(self):
         q = ' OR '.join(['%s:"apples oranges"~10' % lang for lang in self.ocr_langs])
-        self.assertEqual(si.page_search(Q('proxtext=apples%20oranges&proxdistance=10'))[0], '+type:page +((ocr:("apples oranges"~10)^10000 ) OR %s )' %q)
+        self.assertEqual(si.page_search(Q('proxtext=apples%20oranges&proxdistance=10'))[0], '+((ocr:("apples oranges"~10)^10000 ) OR %s )' %q)
         q = ' OR '.join(['%s:"apples oranges"~5' % lang for lang in self.ocr_langs])
-        self.assertEqual(si.page_search(Q('proxtext=apples%20oranges'))[0], '+type:page +((ocr:("apples oranges"~5)^10000 ) OR %s )' %q)
+        self.assertEqual(si.page_search(Q('proxtext=apples%20oranges'))[0], '+((ocr:("apples oranges"~5)^10000 ) OR %s )' %q)
 
     def test_page_search_language(self):
-        self.assertEqual(si.page_search(Q('proxtext=apples%20oranges&language=English'))[0], '+type:page +language:English +((ocr:("apples oranges"~5)^10000 AND ocr_eng:"apples oranges"~5 ) OR ocr_eng:"apples oranges"~5 )')
+        q, fq, facet_params, q_params = si.page_search(Q('proxtext=apples%20oranges&language=English'))
+        self.assertEqual(q, '+((ocr:("apples oranges"~5)^10000 AND ocr_eng:"apples oranges"~5 ) OR ocr_eng:"apples oranges"~5 )')
+        self.assertEqual(fq, ['type:page', '{!tag=language}language:"English"'])
+
+    # page_search, edismax OCR query mode
+
+    @override_settings(SOLR_OCR_QUERY_MODE='edismax')
+    def test_page_search_edismax_ortext(self):
+        q, fq, facet_params, q_params = si.page_search(Q('ortext=apples%20oranges'))
+        self.assertEqual(q, '+_query_:"{!edismax qf=$ocr_qf pf=$ocr_qf mm=1 v=$ocr_or}"')
+        self.assertEqual(q_params['ocr_or'], '"apples" "oranges"')
+        self.assertEqual(q_params['ocr_qf'], ' '.join(['ocr^10000'] + self.ocr_langs))
+
+    @override_settings(SOLR_OCR_QUERY_MODE='edismax')
+    def test_page_search_edismax_andtext(self):
+        q, fq, facet_params, q_params = si.page_search(Q('andtext=apples%20oranges'))
+        # like the boolean query, every word must match in one field
+        clauses = ['_query_:"{!edismax qf=%s pf=%s mm=100%% v=$ocr_and}"' % (f, f)
+                   for f in ['ocr^10000'] + self.ocr_langs]
+        self.assertEqual(q, '+(%s)' % ' OR '.join(clauses))
+        self.assertEqual(q_params, {'ocr_and': '"apples" "oranges"'})
+
+    @override_settings(SOLR_OCR_QUERY_MODE='edismax')
+    def test_page_search_edismax_phrase_and_prox(self):
+        q, fq, facet_params, q_params = si.page_search(
+            Q('phrasetext=new%20york&proxtext=apples%20oranges&language=English'))
+        self.assertEqual(q_params, {
+            'ocr_phrase': '"new york"',
+            'ocr_prox': '"apples oranges"~5',
+            'ocr_qf': 'ocr_eng',
+        })
+        self.assertEqual(q.count('_query_'), 2)
+
+    @override_settings(SOLR_OCR_QUERY_MODE='edismax')
+    def test_page_search_edismax_language(self):
+        # like the boolean query, only the language's field can match
+        q, fq, facet_params, q_params = si.page_search(Q('andtext=apples%20oranges&language=English'))
+        self.assertEqual(q, '+(_query_:"{!edismax qf=ocr_eng pf=ocr_eng mm=100% v=$ocr_and}")')
+        self.assertEqual(q_params, {'ocr_and': '"apples" "oranges"'})
+        self.assertEqual(fq, ['type:page', '{!tag=language}language:"English"'])
+
+    @override_settings(SOLR_OCR_QUERY_MODE='edismax')
+    def test_page_search_edismax_no_text(self):
+        self.assertEqual(si.page_search(Q('state=California'))[3], {})
+
+    def test_ocr_query_modes_match(self):
+        """
+        Both ways of querying the OCR fields find the same pages
+        """
+        solr = si.conn()
+        solr.delete(q='type:page')
+        si.index_pages()
+        solr.commit()
+        searches = [
+            'ortext=too%20nothing',
+            'andtext=fake%20too',
+            'andtext=this%20too',
+            'phrasetext=fake%20ocr%20from',
+            'proxtext=fake%20indexed&proxdistance=20',
+            'andtext=fake&language=English',
+        ]
+        for search in searches:
+            hits = []
+            for mode in ('boolean', 'edismax'):
+                with self.settings(SOLR_OCR_QUERY_MODE=mode):
+                    q, fq, facet_params, q_params = si.page_search(Q(search))
+                    docs = solr.search(q, fq=fq, fl='id', **q_params).docs
+                    hits.append(sorted(d['id'] for d in docs))
+            self.assertEqual(hits[0], hits[1], search)
 
     # TODO can add tests for faceting once there is a solr test environment
 
@@ -1,8 +1,14 @@
-from django.test import TestCase
+import json
+from unittest import mock
+
+import pysolr
+from django.test import TestCase, override_settings
 from django.conf import settings
+from django.core.paginator import Paginator
 from django.http import QueryDict
 
-from core import solr_index
+from core import models, solr_index
+from core.utils.utils import _page_range_short
 
 class SolrPaginatorTests(TestCase):
     fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
@@ -18,3 +24,151 @@ class SolrPaginatorTests(TestCase):
         q = QueryDict('proxtext=')
         p = solr_index.SolrPaginator(q)
         self.assertEqual(108, p.count)
+
+    def test_count_from_page_query(self):
+        solr = solr_index.conn()
+        solr.delete(q='type:page')
+        solr_index.index_pages()
+        solr.commit()
+
+        q = QueryDict('proxtext=&rows=10')
+        p = solr_index.SolrPaginator(q)
+        page = p.page(2)
+        # the page's own query supplied the count, and asking for the same
+        # page again doesn't go back to solr
+        self.assertEqual(1, len(p._responses))
+        self.assertEqual(108, p._count)
+        self.assertEqual(11, page.start_index())
+        p.page(2)
+        self.assertEqual(1, len(p._responses))
+
+    def test_lookup_many(self):
+        ids = [
+            '/lccn/sn83030214/1898-01-08/ed-1/seq-2/',
+            '/lccn/sn83030214/1898-01-01/ed-1/seq-1/',
+            '/lccn/sn83030214/1898-01-01/ed-1/seq-99/',
+            '/not/a/page/',
+        ]
+        with self.assertNumQueries(1):
+            pages = models.Page.lookup_many(ids)
+            urls = [pages[i].url for i in ids if i in pages]
+        self.assertEqual(urls, ids[:2])
+        self.assertEqual(pages[ids[0]], models.Page.lookup(ids[0]))
+
+    def test_navigation(self):
+        solr = solr_index.conn()
+        solr.delete(q='type:page')
+        solr_index.index_pages()
+        solr.commit()
+
+        q = QueryDict('proxtext=&rows=10&page=2&index=0')
+        p = solr_index.SolrPaginator(q)
+        previous_result, next_result = p.navigation()
+        self.assertEqual(108, p.count)
+
+        full = solr_index.SolrPaginator(q)
+        previous_page = full.page(1).object_list[9]
+        next_page = full.page(2).object_list[1]
+        self.assertTrue(previous_result.startswith(previous_page.url + '#'))
+        self.assertIn('page=1&index=9', previous_result)
+        self.assertTrue(next_result.startswith(next_page.url + '#'))
+        self.assertIn('page=2&index=1', next_result)
+
+        q = QueryDict('proxtext=&rows=10&page=1&index=0')
+        p = solr_index.SolrPaginator(q)
+        self.assertIsNone(p.previous_result)
+        self.assertTrue(p.next_result.startswith(full.page(1).object_list[1].url))
+
+    @override_settings(SOLR_SEARCH_CACHE_TTL=0)
+    def test_lazy_highlighting(self):
+        solr = solr_index.conn()
+        solr.delete(q='type:page')
+        solr_index.index_pages()
+        solr.commit()
+
+        q = QueryDict('andtext=the&rows=10')
+        inline = solr_index.SolrPaginator(q).page(1)
+        with override_settings(SOLR_HIGHLIGHT_MODE='lazy'):
+            lazy = solr_index.SolrPaginator(q).page(1)
+        self.assertEqual([p.url for p in inline.object_list],
+                         [p.url for p in lazy.object_list])
+        self.assertEqual([p.words for p in inline.object_list],
+                         [p.words for p in lazy.object_list])
+
+    @override_settings(SOLR_EXPORT_ROWS=25)
+    def test_cursor_paging(self):
+        solr = solr_index.conn()
+        solr.delete(q='type:page')
+        solr_index.index_pages()
+        solr.commit()
+
+        q = QueryDict('proxtext=&rows=50&sort=date')
+        exported = [doc['id'] for doc in solr_index.SolrPaginator(q).export()]
+        self.assertEqual(108, len(set(exported)))
+
+        paged = []
+        cursor = '*'
+        while cursor:
+            p = solr_index.SolrPaginator(q)
+            docs, cursor = p.cursor_page(cursor)
+            self.assertEqual(108, p.count)
+            paged.extend(doc['id'] for doc in docs)
+        self.assertEqual(exported, paged)
+
+    @override_settings(SOLR_SEARCH_CACHE_TTL=60)
+    def test_cursor_page(self):
+        response = {
+            'response': {'numFound': 108, 'docs': [
+                {'id': '/lccn/sn83030214/1898-01-01/ed-1/seq-1/',
+                 'lccn': 'sn83030214', 'date': 18980101}]},
+            'nextCursorMark': 'AoE',
+        }
+        with mock.patch.object(pysolr.Solr, '_select', return_value=json.dumps(response)) as select:
+            p = solr_index.SolrPaginator(QueryDict('proxtext=&rows=1'))
+            docs, cursor = p.cursor_page('*')
+        self.assertEqual('*', select.call_args[0][0]['cursorMark'])
+        self.assertEqual('AoE', cursor)
+        self.assertEqual(108, p.count)
+        self.assertEqual('18980101', docs[0]['date'])
+        self.assertEqual('New-York tribune.', docs[0]['title'])
+
+    @override_settings(SOLR_SEARCH_CACHE_TTL=0)
+    def test_lookup_page(self):
+        page = models.Page.objects.filter(issue__date_issued='1898-01-01').first()
+        response = {'response': {'numFound': 2, 'docs': [
+            {'id': page.url}, {'id': '/lccn/sn83030214/1800-01-01/ed-1/seq-1/'}]}}
+        with mock.patch.object(pysolr.Solr, '_select', return_value=json.dumps(response)) as select:
+            p = solr_index.SolrPaginator(QueryDict('proxtext=&rows=2'))
+            results = p.lookup_page(1)
+        # only ids are asked for, so no titles are looked up
+        self.assertEqual('id', select.call_args[0][0]['fl'])
+        self.assertEqual([page], list(results.object_list))
+        self.assertEqual(2, p.count)
+
+        with mock.patch.object(pysolr.Solr, '_select', return_value=json.dumps(response)):
+            r = self.client.get('/search/pages/results/?format=atom&proxtext=&rows=2')
+        self.assertEqual(200, r.status_code)
+        self.assertContains(r, page.url)
+
+    def test_page_range_short(self):
+        def walk_all(paginator, page):
+            for p in paginator.page_range:
+                if p <= 3 or paginator.num_pages - p < 3:
+                    yield p
+                elif abs(p - page.number) < 3:
+                    yield p
+                elif abs(p - page.number) == 3:
+                    yield "..."
+
+        for num_pages in (1, 2, 5, 7, 12, 40):
+            paginator = Paginator(range(num_pages * 10), 10)
+            for number in paginator.page_range:
+                page = paginator.page(number)
+                self.assertEqual(list(walk_all(paginator, page)),
+                                 list(_page_range_short(paginator, page)))
+
+        paginator = Paginator(range(10 ** 8), 20)
+        page = paginator.page(2500000)
+        self.assertEqual([1, 2, 3, '...', 2499998, 2499999, 2500000, 2500001,
+                          2500002, '...', 4999998, 4999999, 5000000],
+                         list(_page_range_short(paginator, page)))
@@ -0,0 +1,111 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.http import QueryDict
+
+from core import models, solr_index
+
+
+@override_settings(SEARCH_BACKEND='sqlite', CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'sqlite-index-tests'}})
+class SQLiteIndexTests(TestCase):
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/many_pages.json', 'test/ethnicities.json', 'test/languages.json']
+
+    def setUp(self):
+        storage = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage)
+        settings = override_settings(
+            SEARCH_SQLITE_PATH=os.path.join(storage, 'search.sqlite3'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        solr_index.index_pages()
+
+    def test_conn(self):
+        self.assertIsInstance(solr_index.conn(), solr_index.sqlite_index.SQLiteIndex)
+        self.assertEqual(108, solr_index.page_count())
+
+    def test_paginator(self):
+        p = solr_index.SolrPaginator(QueryDict('proxtext=&rows=10&sort=date'))
+        page = p.page(2)
+        self.assertEqual(108, p.count)
+        self.assertEqual(10, len(page.object_list))
+        dates = [pg.issue.date_issued for pg in p.page(1).object_list + page.object_list]
+        self.assertEqual(sorted(dates), dates)
+        self.assertEqual(108, sum(count for year, count in page.facets['year']))
+
+        # title display fields come from the database rather than the index
+        doc = p.docs_page(1).object_list[0]
+        title = models.Title.objects.get(lccn=doc['lccn'])
+        self.assertEqual(title.display_name, doc['title'])
+        self.assertEqual(title.solr_doc['subject'], doc['subject'])
+
+        sequence = models.Page.objects.filter(sequence=1).count()
+        p = solr_index.SolrPaginator(QueryDict('proxtext=&sequence=1'))
+        self.assertEqual(sequence, p.count)
+
+    def test_text_search(self):
+        solr = solr_index.conn()
+        solr.add([
+            {'id': '/lccn/x/1900-01-01/ed-1/seq-1/', 'type': 'page',
+             'date': '19000101', 'ocr_eng': 'The Fire Departments arrived.'},
+            {'id': '/lccn/x/1900-01-02/ed-1/seq-1/', 'type': 'page',
+             'date': '19000102', 'ocr_eng': 'A department store'},
+        ])
+        solr.commit()
+
+        q, fq, facet_params, q_params = solr_index.page_search(
+            QueryDict('andtext=fire department'))
+        results = solr.search(q, fq=fq, hl='true', **q_params)
+        self.assertEqual(1, results.hits)
+        self.assertEqual(19000101, results.docs[0]['date'])
+        words = solr_index.find_words(
+            results.highlighting['/lccn/x/1900-01-01/ed-1/seq-1/']['ocr'][0])
+        self.assertEqual(['Fire', 'Departments'], words)
+
+        q, fq, facet_params, q_params = solr_index.page_search(
+            QueryDict('ortext=fire department'))
+        self.assertEqual(2, solr.search(q, fq=fq, **q_params).hits)
+
+        q, fq, facet_params, q_params = solr_index.page_search(
+            QueryDict('phrasetext=fire department'))
+        self.assertEqual(1, solr.search(q, fq=fq, **q_params).hits)
+
+        q, fq, facet_params, q_params = solr_index.page_search(
+            QueryDict('phrasetext=fire arrived'))
+        self.assertEqual(0, solr.search(q, fq=fq, **q_params).hits)
+
+        q, fq, facet_params, q_params = solr_index.page_search(
+            QueryDict('proxtext=fire arrived&proxdistance=2'))
+        self.assertEqual(1, solr.search(q, fq=fq, **q_params).hits)
+
+    def test_delete(self):
+        batch = 'batch_oru_fakey1_ver01'
+        solr = solr_index.conn()
+        solr.delete(q='batch:"%s"' % batch)
+        solr.commit()
+        remaining = models.Page.objects.exclude(issue__batch__name=batch).count()
+        self.assertEqual(remaining, solr_index.page_count())
+
+    def test_audit_index(self):
+        solr = solr_index.conn()
+        missing = models.Page.objects.exclude(ocr_filename=None)[0].url
+        solr.delete(id=missing)
+        stale = '/lccn/sn00000000/1900-01-01/ed-1/seq-1/'
+        solr.add({'id': stale, 'type': 'page'})
+        solr.commit()
+
+        out = io.StringIO()
+        call_command('audit_index', rows=7, stdout=out)
+        self.assertEqual(['stale %s' % stale, 'missing %s' % missing, '1 missing, 1 stale'],
+                         out.getvalue().splitlines())
+
+        call_command('audit_index', '--reindex', '--delete', rows=7, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('audit_index', stdout=out)
+        self.assertEqual('0 missing, 0 stale\n', out.getvalue())
@@ -0,0 +1,114 @@
+import os
+import datetime
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from core import models
+from core.utils.url import url_template
+from core.utils.utils import HTMLCalendar, _stream_file
+
+
+class HTMLCalendarTests(TestCase):
+    fixtures = ['test/countries.json', 'test/awardee.json', 'test/titles.json',
+                'test/many_pages.json']
+
+    def test_formatyear(self):
+        issue = models.Issue.objects.get(date_issued='1898-01-08')
+        models.Issue.objects.create(title=issue.title, batch=issue.batch,
+                                    date_issued=issue.date_issued, edition=2)
+
+        issues = models.Issue.objects.all()
+        with self.assertNumQueries(2):
+            html = HTMLCalendar(firstweekday=6, issues=issues).formatyear(1898)
+        self.assertEqual(26, html.count('class="single '))
+        self.assertEqual(1, html.count('class="multiple '))
+        self.assertIn('<a href="/lccn/sn83030214/1898-01-01/ed-1/">1</a>', html)
+        self.assertIn('<li><a href="/lccn/sn83030214/1898-01-08/ed-2/">ed-2</a></li>', html)
+
+        with self.assertNumQueries(2):
+            html = HTMLCalendar(firstweekday=6, issues=issues, all_issues=True).formatyear(1898)
+        self.assertIn('<li><a href="/lccn/sn83030214/1898-01-01/ed-1/">%s</a></li>'
+                      % issue.title, html)
+
+
+class StreamFileTests(SimpleTestCase):
+
+    def setUp(self):
+        storage = tempfile.TemporaryDirectory()
+        self.addCleanup(storage.cleanup)
+        self.storage = storage.name
+        self.path = os.path.join(self.storage, 'batch', 'data', 'page 1.jp2')
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as f:
+            f.write(b'0123456789')
+
+    def stream(self, **headers):
+        request = RequestFactory().get('/page.jp2', **headers)
+        return _stream_file(request, self.path, 'image/jp2')
+
+    def test_whole_file(self):
+        r = self.stream()
+        self.assertEqual(200, r.status_code)
+        self.assertEqual(b'0123456789', b''.join(r.streaming_content))
+        self.assertEqual('10', r['Content-Length'])
+        self.assertEqual('bytes', r['Accept-Ranges'])
+
+        self.assertEqual(304, self.stream(HTTP_IF_NONE_MATCH=r['ETag']).status_code)
+        self.assertEqual(304, self.stream(HTTP_IF_MODIFIED_SINCE=r['Last-Modified']).status_code)
+
+    def test_ranges(self):
+        for header, content in (('bytes=2-4', b'234'), ('bytes=7-', b'789'),
+                                ('bytes=-3', b'789'), ('bytes=8-20', b'89')):
+            r = self.stream(HTTP_RANGE=header)
+            self.assertEqual(206, r.status_code)
+            self.assertEqual(content, b''.join(r.streaming_content))
+            self.assertEqual(str(len(content)), r['Content-Length'])
+        self.assertEqual('bytes 8-9/10', r['Content-Range'])
+
+        r = self.stream(HTTP_RANGE='bytes=10-')
+        self.assertEqual(416, r.status_code)
+        self.assertEqual('bytes */10', r['Content-Range'])
+
+        # several ranges, malformed ranges and stale If-Range get the whole file
+        etag = self.stream()['ETag']
+        for headers in ({'HTTP_RANGE': 'bytes=0-1,4-5'}, {'HTTP_RANGE': 'bytes=5-2'},
+                        {'HTTP_RANGE': 'bytes=-'},
+                        {'HTTP_RANGE': 'bytes=2-4', 'HTTP_IF_RANGE': '"other"'}):
+            self.assertEqual(200, self.stream(**headers).status_code)
+        r = self.stream(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=etag)
+        self.assertEqual(206, r.status_code)
+
+        # no range of an empty file can be satisfied
+        open(self.path, 'wb').close()
+        for header in ('bytes=-3', 'bytes=0-'):
+            r = self.stream(HTTP_RANGE=header)
+            self.assertEqual(416, r.status_code)
+            self.assertEqual('bytes */0', r['Content-Range'])
+
+    def test_sendfile(self):
+        with self.settings(SENDFILE='xsendfile'):
+            self.assertEqual(self.path, self.stream()['X-Sendfile'])
+        with self.settings(SENDFILE='x-accel-redirect', STORAGE=self.storage):
+            self.assertEqual('/protected/batch/data/page%201.jp2',
+                             self.stream()['X-Accel-Redirect'])
+        # nginx can't be sent to files outside STORAGE
+        with self.settings(SENDFILE='x-accel-redirect',
+                           STORAGE=os.path.join(self.storage, 'batch', 'other')):
+            self.assertRaises(ImproperlyConfigured, self.stream)
+
+
+class UrlTemplateTests(SimpleTestCase):
+
+    def test_url_template(self):
+        template = url_template('openoni_issue_pages_dot_json',
+                                {'date': '1234-56-78', 'edition': 987654321}, lccn='sn83030214')
+        self.assertEqual('/lccn/sn83030214/%(date)s/ed-%(edition)s.json', template)
+
+    def test_samples_in_other_values(self):
+        # an lccn containing the samples doesn't confuse the fields
+        for lccn in ('sn987654321', 'sn1234', 'sn1'):
+            template = models.Issue.url_template('api_chronam_issue', lccn)
+            url = models.Issue.format_url(template, datetime.date(1900, 1, 2), 1)
+            self.assertEqual('/api/chronam/lccn/%s/1900-01-02/ed-1.json' % lccn, url)
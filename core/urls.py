@@ -5,27 +5,29 @@ from django.urls import include, path, re_path
 from django.utils import cache
 from django.views.defaults import page_not_found, server_error
 
+from . import decorator
 from .views import home, browse, directory, reports, search, static, api_chronam
 
 handler404 = page_not_found
 handler500 = server_error
 
 
-def cache_page(function, ttl):
+def cache_page(function, ttl, **kwargs):
+    function = decorator.cache_page(ttl, **kwargs)(function)
     def decorated_function(*args, **kwargs):
-        request = args[0]
         response = function(*args, **kwargs)
-        cache.patch_response_headers(response, ttl)
         cache.patch_cache_control(response, public=True)
         return response
     return decorated_function
 
 urlpatterns = [
     re_path(r'^$',
-        cache_page(home.home, settings.DEFAULT_TTL_SECONDS),
+        cache_page(home.home, settings.DEFAULT_TTL_SECONDS,
+                   server_cache=False, validators=False),
         name="openoni_home"),
     re_path(r'^(?P<date>\d{4}-\d{2}-\d{2})/$',
-        cache_page(home.home, settings.DEFAULT_TTL_SECONDS),
+        cache_page(home.home, settings.DEFAULT_TTL_SECONDS,
+                   server_cache=False, validators=False),
         name="openoni_home_date"),
     re_path(r'^frontpages/(?P<date>\d{4}-\d{1,2}-\d{1,2}).json$',
         cache_page(home.frontpages, settings.DEFAULT_TTL_SECONDS),
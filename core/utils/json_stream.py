@@ -0,0 +1,72 @@
+"""
+Writes JSON documents with very long lists (e.g. every issue of a title) a
+piece at a time, so the lists never have to be held in memory.
+"""
+import json
+import uuid
+
+
+def iterencode(document, indent=None, chunk_size=64 * 1024):
+    """
+    Yields document as JSON in chunks of about chunk_size characters.  Any
+    iterator in document (e.g. a generator over a queryset) is written out
+    as a list while it is consumed.  The output is the same as json.dumps
+    would give for the document with lists in place of the iterators.
+    """
+    iterators = {}
+    nonce = uuid.uuid4().hex
+
+    def placeholder(o):
+        if not hasattr(o, '__next__'):
+            raise TypeError('Object of type %s is not JSON serializable' % o.__class__.__name__)
+        token = '"__iterator_%s_%d__"' % (nonce, len(iterators))
+        iterators[token] = o
+        return token[1:-1]
+
+    text = json.dumps(document, indent=indent, default=placeholder)
+    tokens = sorted(iterators, key=text.index)
+
+    buffer, size = [], 0
+    start = 0
+    for token in tokens:
+        position = text.index(token, start)
+        pieces = [text[start:position]]
+        pieces.append(_encode_list(iterators[token], indent, _line_indent(text, position)))
+        start = position + len(token)
+        for piece in _flatten(pieces):
+            buffer.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield ''.join(buffer)
+                buffer, size = [], 0
+    buffer.append(text[start:])
+    yield ''.join(buffer)
+
+
+def _line_indent(text, position):
+    line = text[text.rfind('\n', 0, position) + 1:position]
+    return line[:len(line) - len(line.lstrip(' '))]
+
+
+def _flatten(pieces):
+    for piece in pieces:
+        if isinstance(piece, str):
+            yield piece
+        else:
+            yield from piece
+
+
+def _encode_list(items, indent, outer):
+    empty = True
+    if indent is None:
+        for item in items:
+            yield ('[' if empty else ', ') + json.dumps(item)
+            empty = False
+        yield '[]' if empty else ']'
+    else:
+        inner = outer + ' ' * indent
+        for item in items:
+            item = json.dumps(item, indent=indent).replace('\n', '\n' + inner)
+            yield ('[\n' if empty else ',\n') + inner + item
+            empty = False
+        yield '[]' if empty else '\n' + outer + ']'
@@ -1,6 +1,8 @@
 from urllib.parse import quote
 from urllib.parse import unquote
 
+from django.urls import reverse
+
 
 def quote_underscore(s, safe=''):
     if ' ' in s:
@@ -23,3 +25,37 @@ def unpack_url_path(path, none='-'):
     if path == none:
         return None
     return unquote_underscore(path)
+
+def url_template(viewname, placeholders, **kwargs):
+    """
+    Reverses viewname with kwargs and the sample values in placeholders,
+    and returns a %-format string with a %(name)s field where each
+    placeholder's value goes, for building many URLs without reversing each
+    one.  Each field is found by reversing again with a different sample,
+    so the samples may appear anywhere else in the URL; they must match
+    their part of the URL pattern, as must the samples with every digit
+    and letter shifted by one.
+    """
+    url = reverse(viewname, kwargs=dict(kwargs, **placeholders))
+    spans = []
+    for name, sample in placeholders.items():
+        other = reverse(viewname, kwargs=dict(kwargs, **dict(placeholders, **{
+            name: str(sample).translate(_SHIFT)})))
+        start = 0
+        while url[start] == other[start]:
+            start += 1
+        end = len(url)
+        while url[end - 1] == other[end - 1 - len(url) + len(other)]:
+            end -= 1
+        spans.append((start, end, name))
+    template = []
+    position = 0
+    for start, end, name in sorted(spans):
+        template.append(url[position:start].replace('%', '%%'))
+        template.append('%%(%s)s' % name)
+        position = end
+    template.append(url[position:].replace('%', '%%'))
+    return ''.join(template)
+
+_SHIFT = str.maketrans('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                       '1234567890bcdefghijklmnopqrstuvwxyzaBCDEFGHIJKLMNOPQRSTUVWXYZA')
@@ -1,16 +1,18 @@
 import calendar
 import datetime
 import os
-import wsgiref.util
+import urllib.parse
 
 from django.conf import settings
 from django import urls
 from django.core.cache import cache
-from django.http import HttpResponse, Http404
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, StreamingHttpResponse, Http404
 from django.db.models import Min, Max
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.utils.http import http_date
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 
 from core import models
 
@@ -25,12 +27,27 @@ def _rdf_base(request):
     return "%s%s" % (settings.BASE_URL, path)
 
 
+def _page_window(num_pages, *ranges):
+    """
+    Returns, in order, the page numbers from 1 to num_pages that fall in any
+    of the given inclusive (first, last) ranges.  Pagination links only ever
+    show pages near the ends and the current page, so this lets them look at
+    a handful of pages rather than the whole page_range.
+    """
+    pages = set()
+    for first, last in ranges:
+        pages.update(range(max(first, 1), min(last, num_pages) + 1))
+    return sorted(pages)
+
+
 def _page_range_short(paginator, page):
     middle = 3
-    for p in paginator.page_range:
+    num_pages = paginator.num_pages
+    for p in _page_window(num_pages, (1, 3), (num_pages - 2, num_pages),
+                          (page.number - middle, page.number + middle)):
         if p <= 3:
             yield p
-        elif paginator.num_pages - p < 3:
+        elif num_pages - p < 3:
             yield p
         elif abs(p - page.number) < middle:
             yield p
@@ -47,10 +64,28 @@ class HTMLCalendar(calendar.Calendar):
         calendar.Calendar.__init__(self, firstweekday)
         self.issues = issues
         self.all_issues = all_issues
+        self._issues_by_date = {}
 
     # CSS classes for the day <td>s
     cssclasses = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
 
+    def year_issues(self, year):
+        """
+        Returns a dict mapping each date in the year to a sorted list of
+        (lccn, date_issued, edition, title) for its issues, fetched with one
+        query for the issues and one for their titles.
+        """
+        if year not in self._issues_by_date:
+            rows = set(self.issues.filter(date_issued__year=year)
+                       .values_list('title_id', 'date_issued', 'edition'))
+            titles = models.Title.objects.in_bulk(set(r[0] for r in rows))
+            by_date = {}
+            for lccn, date_issued, edition in sorted(rows):
+                by_date.setdefault(date_issued, []).append(
+                    (lccn, date_issued, edition, titles[lccn]))
+            self._issues_by_date[year] = by_date
+        return self._issues_by_date[year]
+
     def formatday(self, year, month, day, weekday):
         """
         Return a day as a table cell.
@@ -58,15 +93,7 @@ class HTMLCalendar(calendar.Calendar):
         if day == 0:
             return '<td class="noday">&nbsp;</td>'  # day outside month
         else:
-            r = self.issues.filter(date_issued=datetime.date(year, month, day))
-            issues = set()
-            for issue in r:
-                issues.add((issue.title.lccn,
-                            issue.date_issued, 
-                            issue.edition,
-                            issue.title
-                            ))
-            issues = sorted(list(issues))
+            issues = self.year_issues(year).get(datetime.date(year, month, day), [])
             count = len(issues)
             if count == 1:
                 _class = "single"
@@ -231,21 +258,106 @@ def _get_tip(lccn, date, edition, sequence=1):
     return title, issue, page
 
 
-def _stream_file(path, content_type):
-    """helper function for streaming back the contents of a file"""
-    # must calculate Content-length else django ConditionalGetMiddleware
-    # tries to and fails, since it is streaming back, and it attempts to
-    # calculate len() on the response content!
-    if path:
-        stat = os.stat(path)
-        r = HttpResponse(wsgiref.util.FileWrapper(open(path, 'rb')))
-        r['Content-Type'] = content_type
-        r['Content-Length'] = stat.st_size
-        r['Last-Modified'] = http_date(stat.st_mtime)
-        return r
-    else:
+def _stream_file(request, path, content_type):
+    """
+    helper function for sending back the contents of a file.  If
+    settings.SENDFILE is set the web server sends the file, otherwise it is
+    streamed from here, answering conditional and single-range requests
+    """
+    if not path:
         raise Http404
 
+    if settings.SENDFILE == 'xsendfile':
+        r = HttpResponse(content_type=content_type)
+        r['X-Sendfile'] = path
+        return r
+    if settings.SENDFILE == 'x-accel-redirect':
+        r = HttpResponse(content_type=content_type)
+        relative_path = os.path.relpath(path, settings.STORAGE)
+        if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+            raise ImproperlyConfigured(
+                "SENDFILE x-accel-redirect needs files under STORAGE, not %s" % path)
+        r['X-Accel-Redirect'] = settings.SENDFILE_URL + urllib.parse.quote(relative_path)
+        return r
+
+    stat = os.stat(path)
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = '"%x-%x"' % (last_modified, size)
+    r = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if r is not None:
+        return r
+
+    start, end = 0, size - 1
+    byte_range = _byte_range(request, etag, last_modified, size)
+    if byte_range == (None, None):
+        r = HttpResponse(status=416)
+        r['Content-Range'] = 'bytes */%d' % size
+        return r
+    if byte_range is not None:
+        start, end = byte_range
+
+    # the length must be given, else django ConditionalGetMiddleware tries to
+    # calculate it from the streamed content
+    r = StreamingHttpResponse(_file_chunks(path, start, end - start + 1),
+                              content_type=content_type)
+    if byte_range is not None:
+        r.status_code = 206
+        r['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+    r['Content-Length'] = end - start + 1
+    r['Accept-Ranges'] = 'bytes'
+    r['ETag'] = etag
+    r['Last-Modified'] = http_date(last_modified)
+    return r
+
+
+def _byte_range(request, etag, last_modified, size):
+    """
+    Returns the first and last byte of the single range asked for by the
+    request's Range header, (None, None) if it can't be satisfied (any range
+    of an empty file), or None if the whole file should be sent (no range,
+    several ranges, a malformed header or an If-Range the file no longer
+    matches).
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    if request.method not in ('GET', 'HEAD') or not header.startswith('bytes='):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+
+    spec = header[len('bytes='):].strip()
+    if ',' in spec or '-' not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split('-', 1))
+    if not (first.isdigit() or first == '') or not (last.isdigit() or last == ''):
+        return None
+    if first == '' and last == '':
+        return None
+    if first == '':
+        # the last N bytes
+        if int(last) == 0 or size == 0:
+            return (None, None)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last != '' and int(last) < start:
+        return None
+    if start >= size:
+        return (None, None)
+    end = size - 1 if last == '' else min(int(last), size - 1)
+    return start, end
+
+
+def _file_chunks(path, start, length, chunk_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
 
 def label(instance):
     if isinstance(instance, models.Title):
@@ -3,12 +3,16 @@ import datetime
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.paginator import InvalidPage, Paginator
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.decorators import api_view
 
 from core import models, rest_serializers
+from core.utils.json_stream import iterencode
+
+# issues listed per page when a title or batch is asked for a ?page= of them
+ISSUES_PER_PAGE = 1000
 
 
 @api_view(['GET'])
@@ -46,8 +50,13 @@ def batch(request, batch_name):
         batch = models.Batch.objects.get(name=batch_name)
     except ObjectDoesNotExist:
         return JsonResponse({'detail': 'Batch does not exist'}, status=status.HTTP_404_NOT_FOUND)
-    serializer = rest_serializers.BatchSerializer(batch, context={'request': request})
-    return JsonResponse(serializer.data, safe=False)
+    issues = batch.issues.values_list('title_id', 'date_issued', 'edition')
+    try:
+        issues, paging = _issues_page(request, issues, 'api_chronam_batch', [batch_name])
+    except InvalidPage as e:
+        return JsonResponse({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = rest_serializers.BatchSerializer(batch, context={'request': request, 'issues': issues})
+    return _stream_json(dict(serializer.data, **paging))
 
 
 @api_view(['GET'])
@@ -57,7 +66,7 @@ def batch_list(request, page_number=1):
     List all batches
     """
     try:
-        batches = models.Batch.objects.all().order_by('-created')
+        batches = models.Batch.objects.select_related('awardee').order_by('-created')
         paginator = Paginator(batches, 25)
         page = paginator.page(page_number)
     except InvalidPage as e:
@@ -171,5 +180,37 @@ def title(request, lccn):
         title = models.Title.objects.get(lccn=lccn)
     except ObjectDoesNotExist:
         return JsonResponse({'detail': 'Title does not exist'}, status=status.HTTP_404_NOT_FOUND)
-    serializer = rest_serializers.TitleSerializer(title, context={'request': request})
-    return JsonResponse(serializer.data, safe=False)
+    issues = title.issues.values_list('date_issued', 'edition')
+    try:
+        issues, paging = _issues_page(request, issues, 'api_chronam_title', [lccn])
+    except InvalidPage as e:
+        return JsonResponse({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = rest_serializers.TitleSerializer(title, context={'request': request, 'issues': issues})
+    return _stream_json(dict(serializer.data, **paging))
+
+
+def _issues_page(request, issues, viewname, args):
+    """
+    Returns the issues to list for a title or batch (all of them, read as
+    they are streamed out, unless the request asks for a ?page= of them)
+    and the "count", "pages", "next" and "previous" keys to add when paging
+    """
+    page_number = request.GET.get('page')
+    if page_number is None:
+        return issues.iterator(), {}
+    paginator = Paginator(issues, ISSUES_PER_PAGE)
+    page = paginator.page(page_number)
+    url = settings.BASE_URL + reverse(viewname, args=args)
+    paging = {
+        'count': paginator.count,
+        'pages': paginator.num_pages,
+    }
+    if page.has_next():
+        paging['next'] = '%s?page=%d' % (url, page.next_page_number())
+    if page.has_previous():
+        paging['previous'] = '%s?page=%d' % (url, page.previous_page_number())
+    return page.object_list, paging
+
+
+def _stream_json(data):
+    return StreamingHttpResponse(iterencode(data), content_type='application/json')
@@ -9,6 +9,7 @@ from django import forms as django_forms
 
 from django.conf import settings
 from django.core.paginator import Paginator, InvalidPage
+from django.db.models import OuterRef, Subquery
 from django import urls
 from django.forms import fields
 from django.http import HttpResponse, HttpResponseNotFound, Http404, \
@@ -125,17 +126,15 @@ def issue_pages(request, lccn, date, edition, page_number=1):
                                     edition=edition).order_by("-created")[0]
     except IndexError as e:
         raise Http404
-    issue_pages = []
-    for page in issue.pages.all():
-        # include both issue and page because of how metadata
-        # is being pulled in the template
-        issue_pages.append({'issue': issue, 'page': page})
-    paginator = Paginator(issue_pages, 20)
+    paginator = Paginator(issue.pages.all(), 20)
     try:
         page = paginator.page(page_number)
     except InvalidPage:
         page = paginator.page(1)
     page_range_short = list(_page_range_short(paginator, page))
+    # include both issue and page because of how metadata
+    # is being pulled in the template
+    page.object_list = [{'issue': issue, 'page': p} for p in page.object_list]
 
     # set page number variables
     if page.has_previous():
@@ -214,42 +213,21 @@ def page(request, lccn, date, edition, sequence, words=None):
             # else squish the exception so the page will still get
             # served up minus the highlights
 
-    # Calculate the previous_issue_first_page. Note: it was decided
-    # that we want to skip over issues with missing pages. See ticket
+    # Find the first pages of the previous and next issues. Note: it was
+    # decided that we want to skip over issues with missing pages. See ticket
     # #383.
-    _issue = issue
-    while True:
-        previous_issue_first_page = None
-        _issue = _issue.previous
-        if not _issue:
-            break
-        previous_issue_first_page = _issue.first_page
-        if previous_issue_first_page:
-            break
-
-    # do the same as above but for next_issue this time.
-    _issue = issue
-    while True:
-        next_issue_first_page = None
-        _issue = _issue.next
-        if not _issue:
-            break
-        next_issue_first_page = _issue.first_page
-        if next_issue_first_page:
-            break
+    previous_issue_first_page, next_issue_first_page = issue.neighbour_first_pages()
 
     page_title = "%s, %s, %s" % (label(title), label(issue), label(page))
     page_head_heading = "%s, %s, %s" % (title.display_name, label(issue), label(page))
     page_head_subheading = label(title)
     crumbs = create_crumbs(title, issue, date, edition, page)
 
-    filename = page.jp2_abs_filename
-    if filename:
-        try:
-            im = os.path.getsize(filename)
-            image_size = filesizeformat(im)
-        except OSError:
+    if page.jp2_filename:
+        if page.jp2_size is None:
             image_size = "Unknown"
+        else:
+            image_size = filesizeformat(page.jp2_size)
 
     image_credit = issue.batch.awardee.name
     host = request.get_host()
@@ -455,8 +433,8 @@ def _search_engine_words(request):
     else:
         return []
 
-    # ask solr for the pre-analysis words that could potentially
-    # match on the page. For example if we feed in 'buildings' we could get
+    # get the pre-analysis words that could potentially match on the page
+    # (from its word coordinates, or solr if it has none). For example if we feed in 'buildings' we could get
     # ['building', 'buildings', 'BUILDING', 'Buildings'] depending
     # on the actual OCR for the page id that is passed in
     words = words.split(' ')
@@ -475,17 +453,17 @@ def page_ocr(request, lccn, date, edition, sequence):
 
 def page_pdf(request, lccn, date, edition, sequence):
     title, issue, page = _get_tip(lccn, date, edition, sequence)
-    return _stream_file(page.pdf_abs_filename, 'application/pdf')
+    return _stream_file(request, page.pdf_abs_filename, 'application/pdf')
 
 
 def page_jp2(request, lccn, date, edition, sequence):
     title, issue, page = _get_tip(lccn, date, edition, sequence)
-    return _stream_file(page.jp2_abs_filename, 'image/jp2')
+    return _stream_file(request, page.jp2_abs_filename, 'image/jp2')
 
 
 def page_ocr_xml(request, lccn, date, edition, sequence):
     title, issue, page = _get_tip(lccn, date, edition, sequence)
-    return _stream_file(page.ocr_abs_filename, 'application/xml')
+    return _stream_file(request, page.ocr_abs_filename, 'application/xml')
 
 
 def page_ocr_txt(request, lccn, date, edition, sequence):
@@ -531,23 +509,35 @@ def page_print(request, lccn, date, edition, sequence,
 @cache_page(settings.DEFAULT_TTL_SECONDS)
 def issues_first_pages(request, lccn, page_number=1):
     title = get_object_or_404(models.Title, lccn=lccn)
-    issues = title.issues.all()
-    if not issues.count() > 0:
+    paginator = Paginator(title.issues.all(), 20)
+    if paginator.count == 0:
         raise Http404("No issues for %s" % title.display_name)
 
-    first_pages = []
-    for issue in issues:
-        # include both issue and page because in some cases
-        # an issue exists which has no associated pages
-        first_pages.append({'issue': issue, 'page': issue.first_page})
-
-    paginator = Paginator(first_pages, 20)
     try:
         page = paginator.page(page_number)
     except InvalidPage:
         page = paginator.page(1)
     page_range_short = list(_page_range_short(paginator, page))
 
+    # get the id of each issue's first page with a subquery, only for the
+    # issues on this page, then fetch those pages together
+    first_page_id = models.Page.objects.filter(issue=OuterRef('pk')) \
+        .order_by('sequence').values('id')[:1]
+    issues = list(page.object_list.annotate(first_page_id=Subquery(first_page_id)))
+    pages = models.Page.objects.select_related('issue__batch') \
+        .in_bulk([issue.first_page_id for issue in issues if issue.first_page_id])
+    # include both issue and page because in some cases
+    # an issue exists which has no associated pages
+    first_pages = [{'issue': issue, 'page': pages.get(issue.first_page_id)}
+                   for issue in issues]
+    page.object_list = first_pages
+    # the template's alternate links are for the title's latest issue, which
+    # the last page already has (issues are in date order)
+    if page.has_next():
+        issue = title.last_issue
+    else:
+        issue = issues[-1]
+
     # set page number variables
     if page.has_previous():
         previous_page_number = int(page_number) - 1
@@ -5,7 +5,7 @@ import json
 from django.conf import settings
 from django import urls
 from django.db.models import Min, Max, Count
-from django.http import HttpResponse, HttpResponseNotFound, Http404
+from django.http import HttpResponse, HttpResponseNotFound, Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.template import RequestContext
 from django.core.paginator import Paginator, InvalidPage
@@ -66,7 +66,7 @@ def batches_json(request):
         "label": "Batches",
         "collections": []
     }
-    for batch in models.Batch.objects.all():
+    for batch in models.Batch.objects.select_related('awardee'):
         j['collections'].append(batch.json(serialize=False, include_issues=False, host=host))
     return HttpResponse(json.dumps(j, indent=2), content_type='application/json')
 
@@ -125,7 +125,8 @@ def batch_rdf(request, batch_name):
 def batch_json(request, batch_name):
     batch = get_object_or_404(models.Batch, name=batch_name)
     host = request.get_host()
-    return HttpResponse(batch.json(host=host), content_type='application/json')
+    return StreamingHttpResponse(batch.json(host=host, stream=True),
+                                 content_type='application/json')
 
 
 @cors
@@ -133,7 +134,8 @@ def batch_json(request, batch_name):
 def title_json(request, lccn):
     title = get_object_or_404(models.Title, lccn=lccn)
     host = request.get_host()
-    return HttpResponse(title.json(host=host), content_type='application/json')
+    return StreamingHttpResponse(title.json(host=host, stream=True),
+                                 content_type='application/json')
 
 
 @cors
@@ -334,7 +336,7 @@ def institution_titles(request, code, page_number=1):
     return render(request, 'reports/institution_titles.html', locals())
 
 
-@cache_page(10)
+@cache_page(10, validators=False)
 def status(request):
     page_title = 'System Status'
     page_count = models.Page.objects.all().count()
@@ -1,5 +1,7 @@
 import re
+import csv
 import json
+import itertools
 from rfc3339 import rfc3339
 
 from django.db.models import Q
@@ -7,14 +9,14 @@ from django.conf import settings
 from django import urls
 from django.core.paginator import InvalidPage
 from django.shortcuts import render
-from django.http import HttpResponse, HttpResponseRedirect, HttpResponseNotFound
+from django.http import HttpResponse, HttpResponseRedirect, HttpResponseNotFound, StreamingHttpResponse
 from django.template import RequestContext
 from django.utils import timezone
 
 from core import models
 from core import solr_index
 from core import forms
-from core.decorator import opensearch_clean, cache_page, cors
+from core.decorator import opensearch_clean, cache_page, cors, solr_unavailable
 from core.utils.utils import _page_range_short, fulltext_range
 
 def search_pages_paginator(request):
@@ -36,14 +38,29 @@ def search_pages_paginator(request):
 
 
 @cors
-@cache_page(settings.DEFAULT_TTL_SECONDS)
+@solr_unavailable
+@cache_page(settings.DEFAULT_TTL_SECONDS, server_cache=False)
 @opensearch_clean
 def search_pages_results(request, view_type='gallery'):
     page_title = "Search Results"
     paginator = search_pages_paginator(request)
     q = paginator.query
+    format = request.GET.get('format', None)
+    if format in ('jsonl', 'csv'):
+        return _search_pages_export(paginator, format)
+    if format == 'json' and 'cursor' in request.GET:
+        return _search_pages_cursor(request, paginator)
     try:
-        page = paginator.page(paginator._cur_page)
+        if format == 'json':
+            # API results come straight from solr's stored fields
+            include_ocr = request.GET.get('ocr') in ('1', 'true')
+            page = paginator.docs_page(paginator._cur_page, include_ocr)
+        elif format == 'atom':
+            # entries need image paths for their thumbnails, which solr
+            # doesn't store, so only ids come from solr
+            page = paginator.lookup_page(paginator._cur_page)
+        else:
+            page = paginator.page(paginator._cur_page)
     except InvalidPage:
         url = urls.reverse('openoni_search_pages_results')
         # Set the page to the first page
@@ -69,7 +86,6 @@ def search_pages_results(request, view_type='gallery'):
     crumbs = list(settings.BASE_CRUMBS)
 
     host = request.get_host()
-    format = request.GET.get('format', None)
     if format == 'atom':
         feed_url = settings.BASE_URL + request.get_full_path()
         updated = rfc3339(timezone.now())
@@ -81,7 +97,7 @@ def search_pages_results(request, view_type='gallery'):
             'endIndex': end,
             'totalItems': paginator.count,
             'itemsPerPage': rows,
-            'items': [p.solr_doc for p in page.object_list],
+            'items': page.object_list,
         }
         for i in results['items']:
             i['url'] = settings.BASE_URL + i['id'].rstrip('/') + '.json'
@@ -129,6 +145,74 @@ def search_pages_results(request, view_type='gallery'):
 
     return render(request, template, locals())
 
+def _search_pages_cursor(request, paginator):
+    """
+    JSON search results paged with solr cursors rather than page numbers:
+    "cursor=*" starts at the beginning and each response's nextCursor gets
+    the following page, so paging deep into the results stays cheap.
+    """
+    include_ocr = request.GET.get('ocr') in ('1', 'true')
+    cursor = request.GET['cursor'] or '*'
+    items, next_cursor = paginator.cursor_page(cursor, include_ocr)
+    for i in items:
+        i['url'] = settings.BASE_URL + i['id'].rstrip('/') + '.json'
+    results = {
+        'totalItems': paginator.count,
+        'itemsPerPage': paginator.per_page,
+        'cursor': cursor,
+        'nextCursor': next_cursor,
+        'items': items,
+    }
+    json_text = json.dumps(results, indent=2)
+    # jsonp?
+    if request.GET.get('callback') is not None:
+        json_text = "%s(%s);" % (request.GET.get('callback'), json_text)
+    return HttpResponse(json_text, content_type='application/json')
+
+
+class _Echo(object):
+    """
+    File-like object for csv.writer that just hands back what it's given.
+    """
+    def write(self, value):
+        return value
+
+
+def _search_pages_export(paginator, format):
+    """
+    Streams every page in the results, one JSON object per line (jsonl) or
+    one CSV row per page, walking the results with solr cursors so memory use
+    doesn't grow with the size of the result set.
+    """
+    docs = paginator.export()
+    # fetch the first batch now, so solr being unavailable gets a proper
+    # response rather than a broken stream
+    first = list(itertools.islice(docs, 1))
+    docs = itertools.chain(first, docs)
+
+    fields = list(settings.SOLR_API_FIELDS) + ['url']
+    def with_url(docs):
+        for doc in docs:
+            doc['url'] = settings.BASE_URL + doc['id'].rstrip('/') + '.json'
+            yield doc
+
+    if format == 'csv':
+        writer = csv.writer(_Echo())
+        def value(v):
+            return '; '.join(str(i) for i in v) if isinstance(v, list) else v
+        lines = itertools.chain(
+            [writer.writerow(fields)],
+            (writer.writerow([value(doc.get(f)) for f in fields]) for doc in with_url(docs)))
+        content_type = 'text/csv'
+    else:
+        lines = (json.dumps(doc) + '\n' for doc in with_url(docs))
+        content_type = 'application/jsonl'
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="search_results.%s"' % format
+    return response
+
+
 @cache_page(settings.DEFAULT_TTL_SECONDS)
 def search_advanced(request):
     form = forms.SearchPagesForm()
@@ -178,7 +262,8 @@ def suggest_titles(request):
     return HttpResponse(json_text, content_type='application/x-suggestions+json')
 
 
-@cache_page(settings.DEFAULT_TTL_SECONDS)
+@solr_unavailable
+@cache_page(settings.DEFAULT_TTL_SECONDS, server_cache=False)
 def search_pages_navigation(request):
     """Search results navigation data
 
@@ -193,11 +278,14 @@ def search_pages_navigation(request):
 
     paginator = search_pages_paginator(request)
 
+    # navigation() also fetches the count, so call it first
+    previous_result, next_result = paginator.navigation()
+
     search = {}
     search['total'] = paginator.count
     search['current'] = paginator.overall_index + 1  # current is 1-based
     search['results'] = search_url + '?' + paginator.query.urlencode()
-    search['previous_result'] = paginator.previous_result
-    search['next_result'] = paginator.next_result
+    search['previous_result'] = previous_result
+    search['next_result'] = next_result
 
     return HttpResponse(json.dumps(search), content_type="application/json")
@@ -76,6 +76,22 @@ DEFAULT_TTL_SECONDS = API_TTL_SECONDS * 24  # One day
 FEED_TTL_SECONDS = DEFAULT_TTL_SECONDS * 7  # One week
 PAGE_IMAGE_TTL_SECONDS = FEED_TTL_SECONDS * 2  # Two weeks
 
+# Views using cache_page also keep their responses in the 'responses' cache
+# (see CACHES below) for the same time, unless they are bigger than
+# RESPONSE_CACHE_MAX_BYTES.  It holds at most RESPONSE_CACHE_MAX_ENTRIES
+# responses and cached searches (see SOLR_SEARCH_CACHE_TTL).  Loading or purging a batch or loading titles invalidates
+# everything cached.  RESPONSE_CACHE_STATS counts hits and misses for the
+# response_cache_stats command, which costs a cache write per request.
+RESPONSE_CACHE = True
+RESPONSE_CACHE_MAX_BYTES = 1024 * 1024
+RESPONSE_CACHE_MAX_ENTRIES = 50000
+RESPONSE_CACHE_STATS = False
+
+# Whether loading a batch records the SHA-1 digest of every page file (file
+# sizes are always recorded).  This reads every file in full, which makes
+# loads much slower on network storage.
+PAGE_FILE_CHECKSUMS = False
+
 # List of breadcrumbs that will be shown on all pages
 BASE_CRUMBS = [{'label':'Home', 'href': '/'}]
 
@@ -154,6 +170,81 @@ SOLR_LANGUAGES = (
     'tur',
 )
 
+# Solr client connection handling: seconds to wait for a connection and for a
+# response, how many times (and with what backoff factor) to retry failed
+# GET requests, and how many connections to keep open per process
+SOLR_CONNECT_TIMEOUT = 5
+SOLR_READ_TIMEOUT = 30
+SOLR_RETRIES = 2
+SOLR_RETRY_BACKOFF = 0.2
+SOLR_POOL_SIZE = 10
+
+# After this many consecutive Solr failures, searches fail immediately rather
+# than waiting on Solr, until this many seconds have passed
+SOLR_BREAKER_THRESHOLD = 5
+SOLR_BREAKER_RESET_SECONDS = 30
+
+# Page search responses are kept in the 'responses' cache for this many seconds
+# (0 turns the cache off), unless they are bigger than
+# SOLR_SEARCH_CACHE_MAX_BYTES.
+# Loading or purging a batch invalidates everything cached.
+SOLR_SEARCH_CACHE_TTL = 60 * 60 * 24  # One day
+SOLR_SEARCH_CACHE_MAX_BYTES = 256 * 1024
+
+# How page searches query the OCR fields.  'boolean' repeats each full-text
+# clause for the ocr field and every SOLR_LANGUAGES field, which makes for
+# very long queries; 'edismax' sends the search text once and lets Solr's
+# edismax parser expand it over the fields, returning the same pages.
+SOLR_OCR_QUERY_MODE = 'boolean'
+
+# How results pages get the matched words for each page.  'inline' has solr
+# highlight the results as part of the search; 'lazy' searches without
+# highlighting and then asks for highlighting for just the page ids shown.
+# SOLR_HIGHLIGHT_METHOD picks solr's highlighter (hl.method): None for solr's
+# default, or e.g. 'unified', which is usually much faster on long OCR text.
+# SOLR_HIGHLIGHT_SNIPPETS caps the snippets solr builds per page and field.
+SOLR_HIGHLIGHT_MODE = 'inline'
+SOLR_HIGHLIGHT_METHOD = None
+SOLR_HIGHLIGHT_SNIPPETS = 100
+
+# Stored solr fields returned for each page in JSON search results.  OCR text
+# is left out unless the client asks for it with "ocr=true".
+SOLR_API_FIELDS = (
+    'id',
+    'type',
+    'title',
+    'title_normal',
+    'lccn',
+    'edition',
+    'place_of_publication',
+    'frequency',
+    'publisher',
+    'start_year',
+    'end_year',
+    'language',
+    'alt_title',
+    'subject',
+    'note',
+    'city',
+    'county',
+    'country',
+    'state',
+    'place',
+    'batch',
+    'date',
+    'month',
+    'year',
+    'day',
+    'page',
+    'sequence',
+    'section_label',
+    'edition_label',
+)
+
+# Number of pages fetched from solr at a time when streaming search results
+# as "format=jsonl" or "format=csv"
+SOLR_EXPORT_ROWS = 500
+
 
 ################################################################
 # ENVIRONMENT SETTINGS
@@ -240,10 +331,23 @@ SECRET_KEY = os.getenv('ONI_SECRET_KEY', 'openoni')
 
 SOLR_BASE_URL = os.getenv('ONI_SOLR_URL', 'http://solr:8983')
 
+# Where pages and titles are indexed and searched: 'solr', or 'sqlite' for an
+# embedded SQLite full-text index (in STORAGE/search.sqlite3) that needs no
+# Solr server.  'sqlite' is meant for small collections, development and
+# benchmarking; its relevance ranking and word matching are approximate.
+SEARCH_BACKEND = os.getenv('ONI_SEARCH_BACKEND', 'solr')
+
 ## Absolute path on disk to the data directory
 #STORAGE = os.getenv('ONI_STORAGE_PATH', os.path.join(BASE_DIR, 'data'))
 STORAGE = os.getenv('ONI_STORAGE_PATH', BASE_DIR / 'data')
 
+# How page PDFs, JP2s and OCR XML are sent: '' streams them from Django,
+# 'xsendfile' hands them to Apache's mod_xsendfile, and 'x-accel-redirect'
+# hands them to nginx at SENDFILE_URL plus their path under STORAGE (which
+# must be an internal location aliased to STORAGE).
+SENDFILE = os.getenv('ONI_SENDFILE', '')
+SENDFILE_URL = os.getenv('ONI_SENDFILE_URL', '/protected/')
+
 
 #################################################################
 ## DEBUG / PRODUCTION MODE
@@ -256,6 +360,9 @@ if DEBUG:
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        },
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
         }
     }
 
@@ -285,6 +392,14 @@ else:
             'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
             'LOCATION': '/var/tmp/django_cache',
             'TIMEOUT': 60 * 60 * 24 * 7 * 8  # Eight weeks
+        },
+        # Kept apart so crawlers filling it don't cull the entries above
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/var/tmp/django_response_cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': RESPONSE_CACHE_MAX_ENTRIES,
+            }
         }
     }
 
@@ -10,6 +10,9 @@ STORAGE_URL = '/data/'
 TITLE_DISPLAY_MEDIUM = False
 TOO_BUSY_LOAD_AVERAGE = 64
 
+# Tests change the database between requests for the same URLs
+RESPONSE_CACHE = False
+
 # Storage path and dependent settings
 STORAGE = BASE_DIR / 'data'
 BATCH_STORAGE = STORAGE / 'batches'